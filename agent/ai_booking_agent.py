@@ -1,25 +1,66 @@
 """
 AI-Enhanced Booking Agent that integrates OpenAI/Grok for natural conversations
 """
+import asyncio
+import logging
 import os
-import sys
-from typing import Dict, Optional, List
-from datetime import datetime
+import re
+import time
+from typing import Dict, Optional, List, Iterator
 
-# Add parent directory to path for imports
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-from models.client import ClientManager
+from models.client import ClientManager, normalize_phone
 from models.appointment import AppointmentManager
 from core.scheduler import Scheduler
 from core.payment_processor import PaymentProcessor
 from core.nlu import NLU
-from core.ai_service import AIEnhancedBookingAgent
+from agent.booking_agent import BookingAgent
+from core.ai_service import AIEnhancedBookingAgent, background_executor, build_static_prompt
+from core.response_cache import SemanticCache
+from core.message_log import MessageLogWriter
+from core.conversation_store import ConversationStore
+from core.request_pool import RequestPool
 from config.settings import (
     DATA_DIR, LOGS_DIR, BOOKING_CONFIRMATION, WELCOME_MESSAGE,
-    DEPOSIT_ENABLED, BUSINESS_NAME, SERVICES
+    DEPOSIT_ENABLED, BUSINESS_NAME, SERVICES, SERVICES_MENU_ROWS
 )
 
+logger = logging.getLogger(__name__)
+
+
+# AI replies containing any of these anywhere, even inside a longer word such as
+# "rebook", hand the conversation back to the structured flow
+_BOOKING_INDICATORS_RE = re.compile(r"book|schedule|appointment|reserve", re.IGNORECASE)
+
+# Bare greetings (or an empty message) answered with the welcome message
+_TRIVIAL_GREETING_RE = re.compile(
+    r"\s*(?:(?:hi|hey|hello|yo|sup|good (?:morning|afternoon|evening))[\s!.?]*)?",
+    re.IGNORECASE
+)
+
+# Bare acknowledgements answered with a canned reply
+_CANNED_REPLIES = {
+    "thanks": "You're welcome! Let me know if there's anything else I can help with.",
+    "thank you": "You're welcome! Let me know if there's anything else I can help with.",
+    "thx": "You're welcome! Let me know if there's anything else I can help with.",
+    "ok": "Great! Let me know if there's anything else I can help with.",
+    "okay": "Great! Let me know if there's anything else I can help with.",
+}
+_CANNED_REPLY_RE = re.compile(
+    r"\s*(" + "|".join(re.escape(k) for k in _CANNED_REPLIES) + r")[\s!.?]*",
+    re.IGNORECASE
+)
+
+# Interim replies sent while a slow AI response is generated, by conversation stage
+_ACKNOWLEDGEMENTS = {
+    "greeting": "Hi! Let me pull that up...",
+    "confirmed": "Got it, one sec...",
+}
+_DEFAULT_ACKNOWLEDGEMENT = "Got it, one sec..."
+
+
+class Acknowledgement(str):
+    """Interim reply yielded ahead of an AI response; not part of the response itself"""
+
 
 class AIBookingAgent:
     """
@@ -27,6 +68,9 @@ class AIBookingAgent:
     Combines structured booking logic with AI-generated responses
     """
     
+    # NLU intents handled by the structured booking flow
+    _STRUCTURED_INTENTS = frozenset({"book", "cancel", "reschedule"})
+    
     def __init__(self, ai_provider: str = "openai"):
         """
         Initialize AI booking agent
@@ -48,37 +92,67 @@ class AIBookingAgent:
             "openai_temperature": float(os.getenv("OPENAI_TEMPERATURE", "0.7")),
             "grok_api_key": os.getenv("GROK_API_KEY"),
             "grok_model": os.getenv("GROK_MODEL", "grok-1"),
-            "grok_temperature": float(os.getenv("GROK_TEMPERATURE", "0.7"))
+            "grok_temperature": float(os.getenv("GROK_TEMPERATURE", "0.7")),
+            "request_timeout": float(os.getenv("AI_REQUEST_TIMEOUT", "8.0")),
+            "max_retries": int(os.getenv("AI_MAX_RETRIES", "1"))
         }
         
         try:
             self.ai_agent = AIEnhancedBookingAgent(ai_provider, ai_config)
             self.ai_enabled = True
-            print(f"✓ AI service initialized with {ai_provider}")
+            logger.info("AI service initialized with %s", ai_provider)
         except Exception as e:
-            print(f"⚠ AI service not available: {e}")
-            print("ℹ Falling back to rule-based responses")
+            logger.warning("AI service not available: %s", e)
+            logger.info("Falling back to rule-based responses")
             self.ai_agent = AIEnhancedBookingAgent("rule_based", {})
             self.ai_enabled = False
         
-        # Conversation state management
-        self.conversations: Dict[str, Dict] = {}
+        # Static system prompt, built once so every AI call shares the same prefix
+        self._static_system_prompt = build_static_prompt(BUSINESS_NAME, SERVICES, DEPOSIT_ENABLED)
+        
+        # Optional cache of AI replies to near-duplicate messages; each AI reply costs
+        # an extra embeddings call, so it is off unless enabled for a provider that embeds
+        self.response_cache = None
+        if (os.getenv("AI_RESPONSE_CACHE", "false").lower() == "true"
+                and self.ai_enabled and self.ai_agent.supports_embeddings):
+            self.response_cache = SemanticCache(ttl=3600, threshold=0.92)
+        
+        # Optional cap on concurrent AI requests (replies are not streamed)
+        self.request_pool = None
+        max_concurrent = int(os.getenv("AI_MAX_CONCURRENT_REQUESTS", "0"))
+        if self.ai_enabled and max_concurrent > 0:
+            self.request_pool = RequestPool(self.ai_agent, max_workers=max_concurrent)
+        
+        # Conversation state management, bounded with least recently used spilled to disk
+        self.conversations = ConversationStore(
+            os.path.join(DATA_DIR, "conversations"), self.client_manager, max_entries=10000
+        )
         
         # Ensure directories exist
-        self._ensure_directories()
-    
-    def _ensure_directories(self):
-        """Create necessary directories"""
-        for directory in [DATA_DIR, LOGS_DIR]:
-            if not os.path.exists(directory):
-                os.makedirs(directory)
+        for directory in (DATA_DIR, LOGS_DIR):
+            os.makedirs(directory, exist_ok=True)
+        
+        # Conversation logs are written off the request path
+        self._log_writer = MessageLogWriter(LOGS_DIR)
+        
+        # Structured-flow agent, sharing this agent's managers, conversation store
+        # and log writer so only one store manages the spill directory
+        self._original_agent = BookingAgent(
+            client_manager=self.client_manager,
+            appointment_manager=self.appointment_manager,
+            payment_processor=self.payment_processor,
+            nlu=self.nlu,
+            conversations=self.conversations,
+            log_writer=self._log_writer
+        )
     
     def _get_conversation_state(self, phone_number: str) -> Dict:
         """Get or create conversation state for a client"""
-        phone_number = phone_number.strip().replace("-", "").replace(" ", "")
+        phone_number = normalize_phone(phone_number)
         
-        if phone_number not in self.conversations:
-            self.conversations[phone_number] = {
+        state = self.conversations.get(phone_number)
+        if state is None:
+            state = {
                 "stage": "greeting",
                 "service": None,
                 "date": None,
@@ -89,39 +163,43 @@ class AIBookingAgent:
                 "messages": [],
                 "use_structured_flow": True  # Toggle between AI and structured flow
             }
+            self.conversations.put(phone_number, state)
         
-        return self.conversations[phone_number]
+        return state
     
     def _build_ai_context(self, state: Dict) -> Dict:
-        """Build context for AI response generation"""
+        """
+        Build context for AI response generation
+        
+        The static prompt is shared verbatim across calls; only `dynamic`
+        changes from turn to turn.
+        """
         return {
-            "business_name": BUSINESS_NAME,
+            "static_prompt": self._static_system_prompt,
             "services": SERVICES,
-            "booking_stage": state["stage"],
-            "selected_service": state.get("service"),
-            "selected_date": state.get("date"),
-            "selected_time": state.get("time"),
-            "client_name": state["client"].name if state["client"].name else "Valued Client",
-            "deposit_enabled": DEPOSIT_ENABLED
+            "services_rows": SERVICES_MENU_ROWS,
+            "dynamic": {
+                "booking_stage": state["stage"],
+                "selected_service": state.get("service"),
+                "selected_date": state.get("date"),
+                "selected_time": state.get("time"),
+                "client_name": state["client"].name if state["client"].name else "Valued Client"
+            }
         }
     
-    def _should_use_structured_flow(self, state: Dict, message: str) -> bool:
+    def _should_use_structured_flow(self, state: Dict, intent: Optional[str],
+                                    extracted_data: Dict) -> bool:
         """
         Determine if we should use structured booking flow or AI conversation
         
+        Routing relies on the NLU result: booking intents and messages naming
+        a date go to the structured flow.
+        
         Returns True for structured flow, False for AI conversation
         """
         # Use structured flow for booking actions
-        booking_keywords = ["book", "schedule", "appointment", "reserve", "tomorrow", "monday", 
-                          "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
-                          "cancel", "reschedule"]
-        
-        message_lower = message.lower()
-        
-        # Check if message contains booking-related keywords
-        for keyword in booking_keywords:
-            if keyword in message_lower:
-                return True
+        if intent in self._STRUCTURED_INTENTS or extracted_data.get("date"):
+            return True
         
         # Check if we're in middle of booking process
         if state["stage"] not in ["greeting", "confirmed"]:
@@ -141,100 +219,212 @@ class AIBookingAgent:
         Returns:
             Response message
         """
+        return "".join(self.process_message_stream(phone_number, message))
+    
+    async def process_message_async(self, phone_number: str, message: str) -> str:
+        """
+        Process incoming message without blocking the event loop
+        
+        The blocking AI call runs in a worker thread so async transports can
+        handle other clients meanwhile; log writes are already queued to the
+        background writer and overlap with generation.
+        
+        Args:
+            phone_number: Client's phone number
+            message: The message content
+        
+        Returns:
+            Response message
+        """
+        return await asyncio.to_thread(self.process_message, phone_number, message)
+    
+    def process_message_stream(self, phone_number: str, message: str,
+                               acknowledge: bool = False) -> Iterator[str]:
+        """
+        Process incoming message, streaming the response as it is generated
+        
+        AI conversation replies are yielded chunk by chunk; structured flow
+        replies are yielded as a single chunk.
+        
+        Args:
+            phone_number: Client's phone number
+            message: The message content
+            acknowledge: Yield an Acknowledgement before a slow AI call, for
+                transports that can deliver more than one message
+        
+        Yields:
+            Chunks of the response message
+        """
         # Log the message
         self._log_message(phone_number, message, is_client=True)
         
         # Get conversation state
         state = self._get_conversation_state(phone_number)
         
-        # Try to parse with NLU first
-        intent, extracted_data = self.nlu.parse_booking_request(message)
+        # Answer trivial messages from a template, skipping NLU and the AI
+        canned = self._canned_reply(state, message)
+        if canned is not None:
+            yield canned
+            self._log_message(phone_number, canned, is_client=False)
+            return
+        
+        # A bare yes/no to the deposit question needs no NLU
+        confirmation = self._original_agent._confirmation_reply(state, message)
+        if confirmation is not None:
+            yield confirmation
+            self._log_message(phone_number, confirmation, is_client=False)
+            return
+        
+        # Try to parse with NLU first; no default intent so routing sees unmatched messages
+        intent, extracted_data = self.nlu.parse_booking_request(message, default_intent=None)
         
         # Update state with extracted data
         self._update_state_from_extraction(state, extracted_data)
         
         # Decide on response strategy
-        use_structured = self._should_use_structured_flow(state, message)
+        use_structured = self._should_use_structured_flow(state, intent, extracted_data)
+        
+        # The structured flow treats unmatched messages as booking requests
+        intent = intent or "book"
         
         if use_structured or not self.ai_enabled:
             # Use structured booking flow
             response = self._handle_structured_flow(state, intent, extracted_data, message)
+            yield response
         else:
             # Use AI conversation
-            response = self._handle_ai_conversation(state, message, intent)
+            chunks = []
+            for chunk in self._handle_ai_conversation_stream(state, message, intent, acknowledge):
+                if not isinstance(chunk, Acknowledgement):
+                    chunks.append(chunk)
+                yield chunk
+            response = "".join(chunks)
         
         # Log the response
         self._log_message(phone_number, response, is_client=False)
+    
+    def _canned_reply(self, state: Dict, message: str) -> Optional[str]:
+        """
+        Get a templated reply for a bare greeting or acknowledgement
         
-        return response
+        Only applies outside an in-progress booking, where such messages would
+        otherwise go to the AI.
+        
+        Returns:
+            Reply or None if the message needs full handling
+        """
+        if state["stage"] not in ("greeting", "confirmed"):
+            return None
+        
+        if state["stage"] == "greeting" and _TRIVIAL_GREETING_RE.fullmatch(message):
+            return WELCOME_MESSAGE
+        
+        match = _CANNED_REPLY_RE.fullmatch(message)
+        if match:
+            return _CANNED_REPLIES[match.group(1).lower()]
+        
+        return None
     
     def _update_state_from_extraction(self, state: Dict, extracted_data: Dict):
         """Update conversation state from NLU extraction"""
-        if extracted_data.get("service"):
-            state["service"] = extracted_data["service"]
-        if extracted_data.get("date"):
-            state["date"] = extracted_data["date"]
-        if extracted_data.get("time"):
-            state["time"] = extracted_data["time"]
-        if extracted_data.get("name"):
-            state["client"].name = extracted_data["name"]
-        if extracted_data.get("email"):
-            state["client"].email = extracted_data["email"]
+        self._original_agent._apply_extraction(state, extracted_data)
     
     def _handle_structured_flow(self, state: Dict, intent: str, 
                                extracted_data: Dict, original_message: str) -> str:
         """Handle message using structured booking logic"""
-        stage = state["stage"]
-        
-        # Import the original booking agent logic
-        from agent.booking_agent import BookingAgent
-        original_agent = BookingAgent()
-        
         # Use the original agent's structured flow
-        return original_agent._handle_message(state, intent, extracted_data, original_message)
+        return self._original_agent._handle_message(state, intent, extracted_data, original_message)
     
     def _handle_ai_conversation(self, state: Dict, message: str, intent: str) -> str:
         """Handle message using AI conversation"""
+        return "".join(self._handle_ai_conversation_stream(state, message, intent))
+    
+    def _handle_ai_conversation_stream(self, state: Dict, message: str, intent: str,
+                                       acknowledge: bool = False) -> Iterator[str]:
+        """Handle message using AI conversation, yielding the response as it streams"""
+        chunks = []
         try:
+            phone_number = state["client"].phone_number
+            
             # Build context for AI
             context = self._build_ai_context(state)
             
-            # Generate AI response
-            ai_response = self.ai_agent.generate_response(
-                state["client"].phone_number,
-                message,
-                context,
-                use_ai=True
-            )
+            # Replies are rendered from the client's own details, so they are only
+            # reused for the same client in the same booking context
+            cache_scope = (phone_number, tuple(context["dynamic"].items()))
+            
+            # Return a cached reply for a near-duplicate message, embedding the
+            # message only when there is something to compare it against
+            embedding = None
+            if self.response_cache is not None and self.response_cache.has_entries(cache_scope):
+                embedding = self.ai_agent.embed(message)
+                cached = None if embedding is None else self.response_cache.lookup(cache_scope, embedding)
+                if cached is not None:
+                    self.ai_agent.record_turn(phone_number, message, cached)
+                    self._check_booking_handoff(state, cached)
+                    yield cached
+                    return
+            
+            # Let the client know we're on it before the slow call
+            if acknowledge:
+                yield Acknowledgement(_ACKNOWLEDGEMENTS.get(state["stage"], _DEFAULT_ACKNOWLEDGEMENT))
             
-            # If AI response suggests booking, switch to structured flow
-            booking_indicators = ["book", "schedule", "appointment", "reserve"]
-            if any(indicator in ai_response.lower() for indicator in booking_indicators):
-                state["use_structured_flow"] = True
+            if self.request_pool is not None:
+                # Send through the request pool as a single chunk
+                chunks.append(self.request_pool.submit(phone_number, message, context))
+                yield chunks[-1]
+            else:
+                # Stream AI response
+                for chunk in self.ai_agent.generate_response_stream(
+                    phone_number,
+                    message,
+                    context,
+                    use_ai=True
+                ):
+                    chunks.append(chunk)
+                    yield chunk
             
-            return ai_response
+            ai_response = "".join(chunks)
+            if self.response_cache is not None:
+                background_executor().submit(self._cache_response, cache_scope, message, embedding, ai_response)
+            
+            self._check_booking_handoff(state, ai_response)
             
         except Exception as e:
-            print(f"AI conversation error: {e}")
-            # Fall back to structured flow
-            return self._handle_structured_flow(state, intent, {}, message)
+            logger.exception("AI conversation error")
+            # Fall back to structured flow if nothing has been sent yet
+            if not chunks:
+                yield self._handle_structured_flow(state, intent, {}, message)
+    
+    @staticmethod
+    def _check_booking_handoff(state: Dict, ai_response: str):
+        """If an AI response suggests booking, switch to structured flow"""
+        if _BOOKING_INDICATORS_RE.search(ai_response):
+            state["use_structured_flow"] = True
+    
+    def _cache_response(self, cache_scope: tuple, message: str,
+                        embedding: Optional[List[float]], ai_response: str):
+        """Cache an AI response, embedding its message first if that wasn't needed for the lookup"""
+        try:
+            if embedding is None:
+                embedding = self.ai_agent.embed(message)
+            if embedding is not None:
+                self.response_cache.insert(cache_scope, embedding, ai_response)
+        except Exception:
+            logger.exception("Failed to cache AI response")
     
     def _log_message(self, phone_number: str, message: str, is_client: bool = True):
-        """Log messages for debugging and analysis"""
-        log_file = os.path.join(LOGS_DIR, f"{phone_number}.log")
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        with open(log_file, 'a') as f:
-            direction = "CLIENT" if is_client else "AGENT"
-            ai_mode = "AI" if is_client else "AI" if self.ai_enabled else "RULE"
-            f.write(f"[{timestamp}] {direction} ({ai_mode}): {message}\n")
+        """Queue a message for the conversation log"""
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        direction = "CLIENT" if is_client else "AGENT"
+        ai_mode = "AI" if is_client else "AI" if self.ai_enabled else "RULE"
+        self._log_writer.write(phone_number, f"[{timestamp}] {direction} ({ai_mode}): {message}\n")
     
     def reset_conversation(self, phone_number: str):
         """Reset conversation to initial state"""
-        phone_number = phone_number.strip().replace("-", "").replace(" ", "")
+        phone_number = normalize_phone(phone_number)
         
-        if phone_number in self.conversations:
-            del self.conversations[phone_number]
+        self.conversations.pop(phone_number)
         
         # Also clear AI conversation history
         if self.ai_enabled:
@@ -256,12 +446,8 @@ class AIBookingAgent:
     # Delegate to original agent methods for booking operations
     def handle_payment_webhook(self, payment_intent_id: str) -> Optional[str]:
         """Handle Stripe payment webhook"""
-        from agent.booking_agent import BookingAgent
-        original_agent = BookingAgent()
-        return original_agent.handle_payment_webhook(payment_intent_id)
+        return self._original_agent.handle_payment_webhook(payment_intent_id)
     
     def send_reminder(self, appointment_id: str) -> str:
         """Send appointment reminder"""
-        from agent.booking_agent import BookingAgent
-        original_agent = BookingAgent()
-        return original_agent.send_reminder(appointment_id)
\ No newline at end of file
+        return self._original_agent.send_reminder(appointment_id)
\ No newline at end of file
@@ -2,53 +2,111 @@
 Main booking agent that handles all client interactions
 """
 from typing import Dict, Optional, List
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
-import sys
+import re
 
-# Add parent directory to path for imports
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-from models.client import ClientManager
+from models.client import ClientManager, normalize_phone
 from models.appointment import AppointmentManager
 from core.scheduler import Scheduler
 from core.payment_processor import PaymentProcessor
 from core.nlu import NLU
+from core.message_log import MessageLogWriter
+from core.conversation_store import ConversationStore
 from config.settings import (
     DATA_DIR, LOGS_DIR, BOOKING_CONFIRMATION, WELCOME_MESSAGE,
-    DEPOSIT_ENABLED
+    DEPOSIT_ENABLED, CANCELLATION_POLICY
 )
 
+# Replies that accept or decline a pending deposit, and that confirm a cancellation
+_DEPOSIT_YES_RE = re.compile(r"\b(yes|proceed)\b", re.IGNORECASE)
+_NO_RE = re.compile(r"\bno\b", re.IGNORECASE)
+_CANCEL_YES_RE = re.compile(r"\b(yes|confirm)\b", re.IGNORECASE)
+
+# A reply to the deposit question that is nothing but a yes or no, with no
+# booking details for NLU to extract
+_BARE_CONFIRMATION_RE = re.compile(
+    r"[\s!.?]*(?:yes|no|proceed)(?:,? (?:please|thanks|thank you))?[\s!.?]*",
+    re.IGNORECASE
+)
+
+# Extracted fields kept on the conversation state and on the client record
+_STATE_FIELDS = ("service", "date", "time")
+_CLIENT_FIELDS = ("name", "email")
+
+# Notice needed for a full or half deposit refund on cancellation
+_FULL_REFUND_NOTICE = timedelta(hours=24)
+_HALF_REFUND_NOTICE = timedelta(hours=12)
+
+# Appointment statuses that can still be rescheduled or cancelled
+_UPCOMING_STATUSES = frozenset(("pending", "confirmed"))
+
 
 class BookingAgent:
     """Main agent that orchestrates the booking process"""
     
-    def __init__(self):
+    def __init__(self, client_manager: Optional[ClientManager] = None,
+                 appointment_manager: Optional[AppointmentManager] = None,
+                 payment_processor: Optional[PaymentProcessor] = None,
+                 nlu: Optional[NLU] = None,
+                 conversations: Optional[ConversationStore] = None,
+                 log_writer: Optional[MessageLogWriter] = None):
+        """
+        Initialize the booking agent
+        
+        Managers, the conversation store and the log writer may be passed in
+        to share them with another agent; any that are omitted are created here.
+        """
         # Initialize managers
-        self.client_manager = ClientManager(DATA_DIR)
-        self.appointment_manager = AppointmentManager(DATA_DIR)
+        self.client_manager = client_manager or ClientManager(DATA_DIR)
+        self.appointment_manager = appointment_manager or AppointmentManager(DATA_DIR)
         self.scheduler = Scheduler(self.appointment_manager)
-        self.payment_processor = PaymentProcessor()
-        self.nlu = NLU()
-        
-        # Conversation state management
-        self.conversations: Dict[str, Dict] = {}
+        self.scheduler.warm_up()
+        self.payment_processor = payment_processor or PaymentProcessor()
+        self.nlu = nlu or NLU()
+        
+        # Replies to informational intents don't depend on conversation state
+        self._static_responses: Dict[str, str] = {
+            intent: self.nlu.get_response_for_intent(intent)
+            for intent in ("greeting", "services", "pricing", "hours", "help")
+        }
+        
+        # Message handler for each conversation stage
+        self._stage_handlers = {
+            "greeting": self._stage_greeting,
+            "collecting_service": self._stage_collecting_service,
+            "collecting_date": self._stage_collecting_date,
+            "collecting_time": self._stage_collecting_time,
+            "awaiting_deposit": self._stage_awaiting_deposit,
+            "confirmed": self._stage_confirmed,
+        }
+        
+        # Conversation state management; compared with None since an empty store is falsy.
+        # No TTL, so a booking left awaiting its deposit is kept however long the client takes
+        if conversations is None:
+            conversations = ConversationStore(
+                os.path.join(DATA_DIR, "conversations"), self.client_manager, max_entries=10000
+            )
+        self.conversations = conversations
         
         # Ensure directories exist
         self._ensure_directories()
+        
+        # Conversation logs are buffered and written in batches every half second
+        self._log_writer = log_writer or MessageLogWriter(LOGS_DIR, flush_interval=0.5)
     
     def _ensure_directories(self):
         """Create necessary directories"""
-        for directory in [DATA_DIR, LOGS_DIR]:
-            if not os.path.exists(directory):
-                os.makedirs(directory)
+        for directory in (DATA_DIR, LOGS_DIR):
+            os.makedirs(directory, exist_ok=True)
     
     def _get_conversation_state(self, phone_number: str) -> Dict:
         """Get or create conversation state for a client"""
-        phone_number = phone_number.strip().replace("-", "").replace(" ", "")
+        phone_number = normalize_phone(phone_number)
         
-        if phone_number not in self.conversations:
-            self.conversations[phone_number] = {
+        state = self.conversations.get(phone_number)
+        if state is None:
+            state = {
                 "stage": "greeting",
                 "service": None,
                 "date": None,
@@ -58,8 +116,9 @@ class BookingAgent:
                 "client": self.client_manager.get_or_create_client(phone_number),
                 "messages": []
             }
+            self.conversations.put(phone_number, state)
         
-        return self.conversations[phone_number]
+        return state
     
     def _update_conversation_state(self, phone_number: str, updates: Dict):
         """Update conversation state"""
@@ -68,18 +127,14 @@ class BookingAgent:
     
     def _reset_conversation(self, phone_number: str):
         """Reset conversation to initial state"""
-        phone_number = phone_number.strip().replace("-", "").replace(" ", "")
-        if phone_number in self.conversations:
-            del self.conversations[phone_number]
+        phone_number = normalize_phone(phone_number)
+        self.conversations.pop(phone_number)
     
     def _log_message(self, phone_number: str, message: str, is_client: bool = True):
-        """Log messages for debugging and analysis"""
-        log_file = os.path.join(LOGS_DIR, f"{phone_number}.log")
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        with open(log_file, 'a') as f:
-            direction = "CLIENT" if is_client else "AGENT"
-            f.write(f"[{timestamp}] {direction}: {message}\n")
+        """Queue a message for the conversation log"""
+        timestamp = datetime.now().isoformat(sep=" ", timespec="seconds")
+        direction = "CLIENT" if is_client else "AGENT"
+        self._log_writer.write(phone_number, f"[{timestamp}] {direction}: {message}\n")
     
     def process_message(self, phone_number: str, message: str) -> str:
         """
@@ -98,168 +153,191 @@ class BookingAgent:
         # Get conversation state
         state = self._get_conversation_state(phone_number)
         
-        # Parse the message
-        intent, extracted_data = self.nlu.parse_booking_request(message)
-        
-        # Handle based on current stage
-        response = self._handle_message(state, intent, extracted_data, message)
+        response = self._confirmation_reply(state, message)
+        if response is None:
+            # Parse the message
+            intent, extracted_data = self.nlu.parse_booking_request(message)
+            
+            # Handle based on current stage
+            response = self._handle_message(state, intent, extracted_data, message)
         
         # Log the response
         self._log_message(phone_number, response, is_client=False)
         
         return response
     
+    def _confirmation_reply(self, state: Dict, message: str) -> Optional[str]:
+        """
+        Answer a bare yes/no to the deposit question without running NLU
+        
+        Returns:
+            Response message, or None if the message needs full handling
+        """
+        if state["stage"] == "awaiting_deposit" and _BARE_CONFIRMATION_RE.fullmatch(message):
+            return self._stage_awaiting_deposit(state, None, {}, message)
+        return None
+    
     def _handle_message(self, state: Dict, intent: str, extracted_data: Dict, original_message: str) -> str:
         """Handle message based on current conversation stage"""
         
         # Update extracted data
-        if extracted_data.get("service"):
-            state["service"] = extracted_data["service"]
-        if extracted_data.get("date"):
-            state["date"] = extracted_data["date"]
-        if extracted_data.get("time"):
-            state["time"] = extracted_data["time"]
-        if extracted_data.get("name"):
-            state["client"].name = extracted_data["name"]
-        if extracted_data.get("email"):
-            state["client"].email = extracted_data["email"]
-        
-        stage = state["stage"]
-        
-        # Stage: greeting
-        if stage == "greeting":
-            if intent == "greeting":
-                return self.nlu.get_response_for_intent("greeting")
-            elif intent == "services":
-                return self.nlu.get_response_for_intent("services")
-            elif intent == "check_availability":
-                return self._handle_check_availability(state, extracted_data)
-            elif intent == "book":
-                if state["service"]:
-                    state["stage"] = "collecting_date"
-                    return f"Great choice! What date would you like to schedule your {state['service']} massage?"
-                else:
-                    state["stage"] = "collecting_service"
-                    return self.nlu.get_response_for_intent("book", {"service": None})
+        self._apply_extraction(state, extracted_data)
+        
+        # Dispatch to the handler for the current stage
+        handler = self._stage_handlers.get(state["stage"], self._handle_other_intent)
+        return handler(state, intent, extracted_data, original_message)
+    
+    def _apply_extraction(self, state: Dict, extracted_data: Dict):
+        """Copy extracted booking details onto the state and client details onto the client"""
+        for key in _STATE_FIELDS:
+            if value := extracted_data.get(key):
+                state[key] = value
+        client = state["client"]
+        changed = False
+        for key in _CLIENT_FIELDS:
+            if (value := extracted_data.get(key)) and getattr(client, key) != value:
+                setattr(client, key, value)
+                changed = True
+        # Go through the manager so name search sees details captured mid-conversation
+        if changed:
+            self.client_manager.update_client(client)
+    
+    def _stage_greeting(self, state: Dict, intent: str, extracted_data: Dict, original_message: str) -> str:
+        """Stage: greeting"""
+        if intent == "greeting":
+            return self._static_responses["greeting"]
+        elif intent == "services":
+            return self._static_responses["services"]
+        elif intent == "check_availability":
+            return self._handle_check_availability(state, extracted_data)
+        elif intent == "book":
+            if state["service"]:
+                state["stage"] = "collecting_date"
+                return f"Great choice! What date would you like to schedule your {state['service']} massage?"
             else:
                 state["stage"] = "collecting_service"
-                return "I'd be happy to help you book an appointment! What type of massage would you like?"
-        
-        # Stage: collecting_service
-        elif stage == "collecting_service":
-            if intent == "book":
-                if state["service"]:
-                    state["stage"] = "collecting_date"
-                    return f"Perfect! What date would you like to schedule your {state['service']} massage?"
-                else:
-                    return self.nlu.get_response_for_intent("services")
+                return self.nlu.get_response_for_intent("book", {"service": None})
+        else:
+            state["stage"] = "collecting_service"
+            return "I'd be happy to help you book an appointment! What type of massage would you like?"
+    
+    def _stage_collecting_service(self, state: Dict, intent: str, extracted_data: Dict, original_message: str) -> str:
+        """Stage: collecting_service"""
+        if intent == "book":
+            if state["service"]:
+                state["stage"] = "collecting_date"
+                return f"Perfect! What date would you like to schedule your {state['service']} massage?"
             else:
-                service = self.nlu.extract_service(original_message)
-                if service:
-                    state["service"] = service
-                    state["stage"] = "collecting_date"
-                    return f"Great! What date would you like to schedule your {service} massage?"
-                else:
-                    return "I didn't catch which service you'd like. Please choose from: Swedish, Deep Tissue, Hot Stone, Aromatherapy, Sports, or Couples massage."
-        
-        # Stage: collecting_date
-        elif stage == "collecting_date":
-            if state["date"]:
-                state["stage"] = "collecting_time"
-                available_slots = self.scheduler.get_available_slots(state["date"])
-                if available_slots:
-                    slots_str = ", ".join([self.scheduler.format_time_display(slot) for slot in available_slots[:5]])
-                    return f"Available times for {self.scheduler.format_date_display(state['date'])}: {slots_str}. What time works best for you?"
-                else:
-                    return f"Unfortunately, we don't have any availability on {self.scheduler.format_date_display(state['date'])}. Would you like to check another date?"
+                return self._static_responses["services"]
+        else:
+            service = self.nlu.extract_service(original_message)
+            if service:
+                state["service"] = service
+                state["stage"] = "collecting_date"
+                return f"Great! What date would you like to schedule your {service} massage?"
             else:
-                return "What date would you like to schedule your appointment? You can say things like 'tomorrow', 'next Monday', or give a specific date like 'January 15'."
-        
-        # Stage: collecting_time
-        elif stage == "collecting_time":
-            if state["time"]:
-                # Validate the appointment
-                is_valid, error_msg = self.scheduler.validate_appointment_request(
-                    state["date"], state["time"], state["service"]
-                )
-                
-                if not is_valid:
-                    # Suggest alternatives
-                    alternatives = self.scheduler.suggest_alternative_times(state["date"], state["time"])
-                    if alternatives:
-                        alt_str = ", ".join([self.scheduler.format_time_display(slot) for slot in alternatives[:3]])
-                        return f"{error_msg}\n\nAvailable alternatives: {alt_str}"
-                    return error_msg
-                
-                # Check if deposit is required
-                service_info = self.scheduler.get_service_info(state["service"])
-                deposit_amount = self.scheduler.calculate_deposit(state["service"], service_info["price"])
-                
-                if deposit_amount > 0 and DEPOSIT_ENABLED:
-                    state["stage"] = "awaiting_deposit"
-                    return f"I can book your {service_info['name']} on {self.scheduler.format_date_display(state['date'])} at {self.scheduler.format_time_display(state['time'])}.\n\nA ${deposit_amount} deposit is required to confirm this appointment. Would you like to proceed with the deposit?"
-                else:
-                    # Create appointment directly
-                    return self._create_appointment(state)
-            
+                return "I didn't catch which service you'd like. Please choose from: Swedish, Deep Tissue, Hot Stone, Aromatherapy, Sports, or Couples massage."
+    
+    def _stage_collecting_date(self, state: Dict, intent: str, extracted_data: Dict, original_message: str) -> str:
+        """Stage: collecting_date"""
+        if state["date"]:
+            state["stage"] = "collecting_time"
+            available_slots = self.scheduler.get_available_slots(state["date"])
+            if available_slots:
+                slots_str = ", ".join([self.scheduler.format_time_display(slot) for slot in available_slots[:5]])
+                return f"Available times for {self.scheduler.format_date_display(state['date'])}: {slots_str}. What time works best for you?"
             else:
-                available_slots = self.scheduler.get_available_slots(state["date"])
-                if available_slots:
-                    slots_str = ", ".join([self.scheduler.format_time_display(slot) for slot in available_slots[:5]])
-                    return f"What time would you prefer? Available slots: {slots_str}"
-                else:
-                    return "No time slots available. Would you like to try a different date?"
-        
-        # Stage: awaiting_deposit
-        elif stage == "awaiting_deposit":
-            if "yes" in original_message.lower() or "proceed" in original_message.lower():
-                # Create appointment first
-                appointment = self._create_appointment_record(state)
-                state["appointment_id"] = appointment.id
-                
-                # Handle deposit
-                service_info = self.scheduler.get_service_info(state["service"])
-                deposit_amount = self.scheduler.calculate_deposit(state["service"], service_info["price"])
-                
-                try:
-                    deposit_info = self.payment_processor.handle_deposit_requirement(
-                        state["service"], service_info["price"], appointment.id, state["client"].email
-                    )
-                    
-                    if deposit_info.get("payment_url"):
-                        state["payment_intent_id"] = deposit_info.get("payment_intent_id")
-                        return deposit_info["message"]
-                    else:
-                        return f"Error creating payment link: {deposit_info.get('error', 'Unknown error')}"
-                
-                except Exception as e:
-                    return f"Sorry, there was an error setting up the deposit: {str(e)}"
+                return f"Unfortunately, we don't have any availability on {self.scheduler.format_date_display(state['date'])}. Would you like to check another date?"
+        else:
+            return "What date would you like to schedule your appointment? You can say things like 'tomorrow', 'next Monday', or give a specific date like 'January 15'."
+    
+    def _stage_collecting_time(self, state: Dict, intent: str, extracted_data: Dict, original_message: str) -> str:
+        """Stage: collecting_time"""
+        if state["time"]:
+            # Validate the appointment
+            is_valid, error_msg = self.scheduler.validate_appointment_request(
+                state["date"], state["time"], state["service"]
+            )
             
-            elif "no" in original_message.lower():
-                state["stage"] = "collecting_time"
-                return "No problem! Would you like to choose a different time or service?"
+            if not is_valid:
+                # Suggest alternatives
+                alternatives = self.scheduler.suggest_alternative_times(state["date"], state["time"])
+                if alternatives:
+                    alt_str = ", ".join([self.scheduler.format_time_display(slot) for slot in alternatives[:3]])
+                    return f"{error_msg}\n\nAvailable alternatives: {alt_str}"
+                return error_msg
             
+            # Check if deposit is required
+            service_info, deposit_amount = self._service_pricing(state)
+            
+            if deposit_amount > 0 and DEPOSIT_ENABLED:
+                state["stage"] = "awaiting_deposit"
+                return f"I can book your {service_info['name']} on {self.scheduler.format_date_display(state['date'])} at {self.scheduler.format_time_display(state['time'])}.\n\nA ${deposit_amount} deposit is required to confirm this appointment. Would you like to proceed with the deposit?"
             else:
-                return "Please let me know if you'd like to proceed with the deposit (yes/no)."
-        
-        # Stage: confirmed
-        elif stage == "confirmed":
-            if intent == "reschedule":
-                return self._handle_reschedule(state, original_message)
-            elif intent == "cancel":
-                return self._handle_cancellation(state, original_message)
+                # Create appointment directly
+                return self._create_appointment(state)
+        
+        else:
+            available_slots = self.scheduler.get_available_slots(state["date"])
+            if available_slots:
+                slots_str = ", ".join([self.scheduler.format_time_display(slot) for slot in available_slots[:5]])
+                return f"What time would you prefer? Available slots: {slots_str}"
             else:
-                return "Your appointment is confirmed! Is there anything else I can help you with?"
+                return "No time slots available. Would you like to try a different date?"
+    
+    def _stage_awaiting_deposit(self, state: Dict, intent: str, extracted_data: Dict, original_message: str) -> str:
+        """Stage: awaiting_deposit"""
+        if _DEPOSIT_YES_RE.search(original_message):
+            # Create appointment first
+            appointment = self._create_appointment_record(state)
+            state["appointment_id"] = appointment.id
+            
+            # Handle deposit
+            service_info, deposit_amount = self._service_pricing(state)
+            
+            try:
+                deposit_info = self.payment_processor.handle_deposit_requirement(
+                    state["service"], service_info["price"], appointment.id, state["client"].email
+                )
+                
+                if deposit_info.get("payment_url"):
+                    state["payment_intent_id"] = deposit_info.get("payment_intent_id")
+                    # Record the intent on the appointment so the webhook can find it
+                    appointment.payment_intent_id = state["payment_intent_id"]
+                    self.appointment_manager.update_appointment(appointment)
+                    return deposit_info["message"]
+                else:
+                    return f"Error creating payment link: {deposit_info.get('error', 'Unknown error')}"
+            
+            except Exception as e:
+                return f"Sorry, there was an error setting up the deposit: {str(e)}"
         
-        # Handle other intents
+        elif _NO_RE.search(original_message):
+            state["stage"] = "collecting_time"
+            return "No problem! Would you like to choose a different time or service?"
+        
+        else:
+            return "Please let me know if you'd like to proceed with the deposit (yes/no)."
+    
+    def _stage_confirmed(self, state: Dict, intent: str, extracted_data: Dict, original_message: str) -> str:
+        """Stage: confirmed"""
+        if intent == "reschedule":
+            return self._handle_reschedule(state, original_message)
+        elif intent == "cancel":
+            return self._handle_cancellation(state, original_message)
+        else:
+            return "Your appointment is confirmed! Is there anything else I can help you with?"
+    
+    def _handle_other_intent(self, state: Dict, intent: str, extracted_data: Dict, original_message: str) -> str:
+        """Handle informational intents outside a known stage"""
         if intent == "services":
-            return self.nlu.get_response_for_intent("services")
+            return self._static_responses["services"]
         elif intent == "pricing":
-            return self.nlu.get_response_for_intent("pricing")
+            return self._static_responses["pricing"]
         elif intent == "hours":
-            return self.nlu.get_response_for_intent("hours")
+            return self._static_responses["hours"]
         elif intent == "help":
-            return self.nlu.get_response_for_intent("help")
+            return self._static_responses["help"]
         elif intent == "check_availability":
             return self._handle_check_availability(state, extracted_data)
         
@@ -283,11 +361,14 @@ class BookingAgent:
             dates_str = ", ".join([self.scheduler.format_date_display(date) for date in available_dates[:7]])
             return f"Here are our available dates in the next 2 weeks: {dates_str}\n\nWhich date would you like to check?"
     
+    def _service_pricing(self, state: Dict):
+        """Get service info and deposit for the chosen service"""
+        service_info = self.scheduler.get_service_info(state["service"])
+        return service_info, self.scheduler.calculate_deposit(state["service"], service_info["price"])
+    
     def _create_appointment_record(self, state: Dict):
         """Create the appointment record"""
-        service_info = self.scheduler.get_service_info(state["service"])
-        
-        deposit_amount = self.scheduler.calculate_deposit(state["service"], service_info["price"])
+        service_info, deposit_amount = self._service_pricing(state)
         
         appointment = self.appointment_manager.create_appointment(
             client_phone=state["client"].phone_number,
@@ -312,7 +393,7 @@ class BookingAgent:
         state["appointment_id"] = appointment.id
         state["stage"] = "confirmed"
         
-        service_info = self.scheduler.get_service_info(state["service"])
+        service_info, _ = self._service_pricing(state)
         
         confirmation = BOOKING_CONFIRMATION.format(
             service=service_info['name'],
@@ -329,16 +410,15 @@ class BookingAgent:
         """Handle reschedule requests"""
         if not state.get("appointment_id"):
             # Find upcoming appointments for this client
-            appointments = self.appointment_manager.get_client_appointments(
-                state["client"].phone_number
-            )
-            upcoming = [a for a in appointments if a.status in ["pending", "confirmed"]]
+            upcoming = next(self.appointment_manager.get_client_appointments_by_status(
+                state["client"].phone_number, _UPCOMING_STATUSES
+            ), None)
             
-            if not upcoming:
+            if upcoming is None:
                 return "You don't have any upcoming appointments to reschedule."
             
             # Use the most recent one
-            state["appointment_id"] = upcoming[0].id
+            state["appointment_id"] = upcoming.id
         
         # Extract new date/time
         new_date = self.nlu.extract_date(message)
@@ -371,35 +451,32 @@ class BookingAgent:
         """Handle cancellation requests"""
         if not state.get("appointment_id"):
             # Find upcoming appointments for this client
-            appointments = self.appointment_manager.get_client_appointments(
-                state["client"].phone_number
-            )
-            upcoming = [a for a in appointments if a.status in ["pending", "confirmed"]]
+            upcoming = next(self.appointment_manager.get_client_appointments_by_status(
+                state["client"].phone_number, _UPCOMING_STATUSES
+            ), None)
             
-            if not upcoming:
+            if upcoming is None:
                 return "You don't have any upcoming appointments to cancel."
             
             # Use the most recent one
-            state["appointment_id"] = upcoming[0].id
+            state["appointment_id"] = upcoming.id
         
         appointment = self.appointment_manager.get_appointment_by_id(state["appointment_id"])
         if not appointment:
             return "Unable to find your appointment."
         
         # Check cancellation policy
-        appointment_datetime = appointment.get_datetime()
-        now = datetime.now()
-        hours_until = (appointment_datetime - now).total_seconds() / 3600
+        time_until = appointment.get_datetime() - datetime.now()
         
-        if hours_until >= 24:
+        if time_until >= _FULL_REFUND_NOTICE:
             refund_amount = appointment.deposit_amount
-        elif hours_until >= 12:
+        elif time_until >= _HALF_REFUND_NOTICE:
             refund_amount = appointment.deposit_amount * 0.5
         else:
             refund_amount = 0
         
         # Process cancellation
-        if "yes" in message.lower() or "confirm" in message.lower():
+        if _CANCEL_YES_RE.search(message):
             appointment.cancel()
             self.appointment_manager.update_appointment(appointment)
             
@@ -412,7 +489,6 @@ class BookingAgent:
             state["stage"] = "greeting"
             return f"Your appointment has been cancelled. {refund_msg}\n\nWould you like to book another appointment?"
         else:
-            from config.settings import CANCELLATION_POLICY
             refund_info = f"\n\nIf cancelled now, you will receive a ${refund_amount:.2f} refund."
             return CANCELLATION_POLICY + refund_info
     
@@ -424,13 +500,13 @@ class BookingAgent:
             Phone number of client to notify, or None
         """
         # Find appointment with this payment intent
-        for appt in self.appointment_manager.appointments:
-            if appt.payment_intent_id == payment_intent_id:
-                appt.mark_deposit_paid(payment_intent_id)
-                self.appointment_manager.update_appointment(appt)
-                return appt.client_phone
+        appt = self.appointment_manager.get_appointment_by_payment_intent(payment_intent_id)
+        if appt is None:
+            return None
         
-        return None
+        appt.mark_deposit_paid(payment_intent_id)
+        self.appointment_manager.update_appointment(appt)
+        return appt.client_phone
     
     def send_reminder(self, appointment_id: str) -> str:
         """Send appointment reminder"""
@@ -1,18 +1,25 @@
 """
 Flask API for the massage booking agent
 """
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import os
-import sys
-
-# Add parent directory to path for imports
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import json
+import logging
 
 from agent.booking_agent import BookingAgent
-from agent.ai_booking_agent import AIBookingAgent
+from agent.ai_booking_agent import AIBookingAgent, Acknowledgement
+
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+)
+
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+# Responses are read by programs; skip sorting keys on every jsonify
+app.json.sort_keys = False
 CORS(app)
 
 # Get AI provider from environment
@@ -86,6 +93,47 @@ def handle_message():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/message/stream', methods=['POST'])
+def handle_message_stream():
+    """
+    Handle incoming messages, streaming the response as Server-Sent Events
+    
+    Expects the same JSON payload as /message. Before a slow AI reply an
+    interim `event: ack` is sent; each response chunk is then sent as a
+    `data:` event, followed by a final `event: done`.
+    """
+    data = request.get_json()
+    
+    if not data:
+        return jsonify({"error": "No JSON data provided"}), 400
+    
+    phone_number = data.get('phone_number')
+    message = data.get('message')
+    
+    if not phone_number or not message:
+        return jsonify({"error": "phone_number and message are required"}), 400
+    
+    def generate():
+        try:
+            if hasattr(agent, 'process_message_stream'):
+                chunks = agent.process_message_stream(phone_number, message, acknowledge=True)
+            else:
+                chunks = [agent.process_message(phone_number, message)]
+            
+            for chunk in chunks:
+                if isinstance(chunk, Acknowledgement):
+                    yield f"event: ack\ndata: {json.dumps(chunk)}\n\n"
+                else:
+                    yield f"data: {json.dumps(chunk)}\n\n"
+            
+            yield "event: done\ndata: {}\n\n"
+        
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps(str(e))}\n\n"
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+
+
 @app.route('/availability', methods=['GET'])
 def check_availability():
     """
@@ -131,29 +179,49 @@ def get_services():
         return jsonify({"error": str(e)}), 500
 
 
+def stream_appointments(appointments, to_row):
+    """
+    Stream a list of appointments as `{"appointments": [...], "success": true}`
+    
+    Each appointment is serialized by `to_row` and sent as it is encoded,
+    rather than building every row and the whole JSON document in memory.
+    The status line has already gone out by the time a row fails, so an
+    error is logged and reported by closing the document with
+    `"success": false` and the error message instead.
+    """
+    def generate():
+        yield '{"appointments": ['
+        separator = ""
+        try:
+            for appt in appointments:
+                row = json.dumps(to_row(appt))
+                yield separator + row
+                separator = ", "
+        except Exception as e:
+            logger.exception("Error streaming appointments")
+            yield '], "success": false, "error": ' + json.dumps(str(e)) + '}'
+            return
+        yield '], "success": true}'
+    
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
 @app.route('/appointments/<phone_number>', methods=['GET'])
 def get_client_appointments(phone_number):
     """Get appointments for a client"""
     try:
         appointments = agent.appointment_manager.get_client_appointments(phone_number)
         
-        appointments_data = []
-        for appt in appointments:
-            appointments_data.append({
-                "id": appt.id,
-                "service": appt.service,
-                "date": appt.date,
-                "time": appt.time,
-                "duration": appt.duration,
-                "price": appt.price,
-                "status": appt.status,
-                "payment_status": appt.payment_status
-            })
-        
-        return jsonify({
-            "success": True,
-            "appointments": appointments_data
-        }), 200
+        return stream_appointments(appointments, lambda appt: {
+            "id": appt.id,
+            "service": appt.service,
+            "date": appt.date,
+            "time": appt.time,
+            "duration": appt.duration,
+            "price": appt.price,
+            "status": appt.status,
+            "payment_status": appt.payment_status
+        })
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -180,33 +248,39 @@ def cancel_appointment(appointment_id):
         return jsonify({"error": str(e)}), 500
 
 
+def process_payment_succeeded(payment_intent_id: str):
+    """Mark the appointment's deposit as paid and move the conversation on"""
+    # Notify client and update appointment
+    client_phone = agent.handle_payment_webhook(payment_intent_id)
+    
+    if client_phone:
+        # Send confirmation to client
+        state = agent._get_conversation_state(client_phone)
+        state["stage"] = "confirmed"
+
+
 @app.route('/webhook/stripe', methods=['POST'])
 def stripe_webhook():
     """
     Handle Stripe webhook events
+    
+    The appointment update is an index lookup and a single-row write, so it
+    runs before responding; if it fails Stripe gets a 500 and retries the
+    event rather than losing it.
     """
     try:
-        import stripe
-        import json
-        
-        payload = request.data
+        payload = request.get_data()
         sig_header = request.headers.get('Stripe-Signature')
         
         # In production, verify webhook signature
         # event = stripe.Webhook.construct_event(payload, sig_header, webhook_secret)
         
-        event = json.loads(payload)
+        # Parsed from the body already buffered above
+        event = request.get_json(force=True)
         
         if event['type'] == 'payment_intent.succeeded':
             payment_intent_id = event['data']['object']['id']
-            
-            # Notify client and update appointment
-            client_phone = agent.handle_payment_webhook(payment_intent_id)
-            
-            if client_phone:
-                # Send confirmation to client
-                state = agent._get_conversation_state(client_phone)
-                state["stage"] = "confirmed"
+            process_payment_succeeded(payment_intent_id)
         
         return jsonify({"success": True}), 200
         
@@ -241,10 +315,9 @@ def get_upcoming_appointments():
     try:
         upcoming = agent.appointment_manager.get_upcoming_appointments()
         
-        appointments_data = []
-        for appt in upcoming:
+        def to_row(appt):
             client = agent.client_manager.get_client_by_phone(appt.client_phone)
-            appointments_data.append({
+            return {
                 "id": appt.id,
                 "client_name": client.name if client else "Unknown",
                 "client_phone": appt.client_phone,
@@ -253,12 +326,9 @@ def get_upcoming_appointments():
                 "time": appt.time,
                 "status": appt.status,
                 "payment_status": appt.payment_status
-            })
+            }
         
-        return jsonify({
-            "success": True,
-            "appointments": appointments_data
-        }), 200
+        return stream_appointments(upcoming, to_row)
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
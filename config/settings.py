@@ -2,8 +2,10 @@
 Configuration settings for the massage parlor booking agent
 """
 import os
+from dataclasses import dataclass
 from datetime import time
-from typing import List
+from types import MappingProxyType
+from typing import FrozenSet, List, Mapping
 
 # Business Settings
 BUSINESS_NAME = "Serenity Massage Therapy"
@@ -17,6 +19,13 @@ BUSINESS_HOURS = {
     "sunday": {"start": "closed", "end": "closed"},
 }
 
+# Opening and closing time of each day, or (None, None) when closed
+BUSINESS_HOURS_PARSED = {
+    day: (None, None) if hours["start"] == "closed"
+    else (time.fromisoformat(hours["start"]), time.fromisoformat(hours["end"]))
+    for day, hours in BUSINESS_HOURS.items()
+}
+
 # Massage Services and Duration (in minutes)
 SERVICES = {
     "swedish": {"name": "Swedish Massage", "duration": 60, "price": 80},
@@ -27,6 +36,9 @@ SERVICES = {
     "couples": {"name": "Couples Massage", "duration": 90, "price": 200},
 }
 
+# (name, duration, price) of each service, for rendering menus and prompts
+SERVICES_MENU_ROWS = tuple((info["name"], info["duration"], info["price"]) for info in SERVICES.values())
+
 # Time Slot Configuration
 SLOT_DURATION = 30  # minutes
 MIN_BOOKING_ADVANCE = 2  # hours
@@ -39,9 +51,18 @@ DEPOSIT_PERCENTAGE = 0.25  # 25% of service price
 DEPOSIT_TYPE = "percentage"  # "fixed" or "percentage"
 DEPOSIT_REQUIRED_FOR_SERVICES = ["hot_stone", "couples"]
 
+# Deposit owed for each service at its list price; services without one are absent
+DEPOSITS_BY_SERVICE = {
+    service: DEPOSIT_AMOUNT if DEPOSIT_TYPE == "fixed" else round(info["price"] * DEPOSIT_PERCENTAGE, 2)
+    for service, info in SERVICES.items()
+    if DEPOSIT_ENABLED and service in DEPOSIT_REQUIRED_FOR_SERVICES
+}
+
 # Payment Settings
 STRIPE_PUBLIC_KEY = os.getenv("STRIPE_PUBLIC_KEY", "")
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY", "")
+# Stripe product all deposit prices belong to; created on first use if missing
+STRIPE_DEPOSIT_PRODUCT_ID = os.getenv("STRIPE_DEPOSIT_PRODUCT_ID", "appointment_deposit")
 
 # SMS/Twilio Settings
 TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID", "")
@@ -92,4 +113,53 @@ CANCELLATION_POLICY = """Cancellation Policy:
 Would you like to proceed with cancellation?"""
 
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
-LOGS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs")
\ No newline at end of file
+LOGS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs")
+
+@dataclass(frozen=True, slots=True)
+class Settings:
+    """Read-only snapshot of the settings above, taken once at import"""
+    business_name: str
+    business_hours: Mapping[str, Mapping[str, str]]
+    services: Mapping[str, Mapping]
+    slot_duration: int
+    min_booking_advance: int
+    max_booking_advance: int
+    deposit_enabled: bool
+    deposit_amount: float
+    deposit_percentage: float
+    deposit_type: str
+    deposit_required_for_services: FrozenSet[str]
+    stripe_public_key: str
+    stripe_secret_key: str
+    twilio_account_sid: str
+    twilio_auth_token: str
+    twilio_phone_number: str
+    data_dir: str
+    logs_dir: str
+
+
+def _read_only(mapping: dict) -> Mapping:
+    """Wrap a dict of dicts in read-only views"""
+    return MappingProxyType({key: MappingProxyType(dict(value)) for key, value in mapping.items()})
+
+
+SETTINGS = Settings(
+    business_name=BUSINESS_NAME,
+    business_hours=_read_only(BUSINESS_HOURS),
+    services=_read_only(SERVICES),
+    slot_duration=SLOT_DURATION,
+    min_booking_advance=MIN_BOOKING_ADVANCE,
+    max_booking_advance=MAX_BOOKING_ADVANCE,
+    deposit_enabled=DEPOSIT_ENABLED,
+    deposit_amount=DEPOSIT_AMOUNT,
+    deposit_percentage=DEPOSIT_PERCENTAGE,
+    deposit_type=DEPOSIT_TYPE,
+    deposit_required_for_services=frozenset(DEPOSIT_REQUIRED_FOR_SERVICES),
+    stripe_public_key=STRIPE_PUBLIC_KEY,
+    stripe_secret_key=STRIPE_SECRET_KEY,
+    twilio_account_sid=TWILIO_ACCOUNT_SID,
+    twilio_auth_token=TWILIO_AUTH_TOKEN,
+    twilio_phone_number=TWILIO_PHONE_NUMBER,
+    data_dir=DATA_DIR,
+    logs_dir=LOGS_DIR,
+)
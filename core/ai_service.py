@@ -1,15 +1,187 @@
 """
 AI Service module for integrating with OpenAI and Grok for enhanced conversation capabilities
 """
+import atexit
+import importlib.util
 import os
-from typing import Optional, Dict, List
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
+from typing import TYPE_CHECKING, Optional, Deque, Dict, List, Iterator, Tuple
 from abc import ABC, abstractmethod
-import json
+
+if TYPE_CHECKING:
+    import httpx
+
+
+@lru_cache(maxsize=8)
+def _render_services_block(rows: Tuple[Tuple[str, int, float], ...]) -> str:
+    """Render (name, duration, price) rows as the services list of a system prompt"""
+    return "".join(f"- {name}: {duration} min - ${price}\n" for name, duration, price in rows)
+
+
+def render_services_block(services: Dict, rows: Optional[Tuple] = None) -> str:
+    """
+    Render the services list of a system prompt
+    
+    The rendered text is cached by the services' name, duration and price, so
+    the static service configuration is only formatted once. Callers holding
+    precomputed (name, duration, price) `rows` (see SERVICES_MENU_ROWS) can
+    pass them to skip reading the services dict.
+    """
+    if rows is None:
+        rows = tuple(
+            (service_info['name'], service_info['duration'], service_info['price'])
+            for service_info in services.values()
+        )
+    return _render_services_block(rows)
+
+
+def build_static_prompt(business_name: str, services: Dict, deposit_enabled: bool) -> str:
+    """
+    Build the static part of the system prompt from business configuration
+    
+    The result is sent verbatim as the first system message on every call so
+    provider-side prompt caching can reuse it; per-turn state goes after it.
+    """
+    parts = [f"""You are a helpful booking assistant for {business_name}. Your role is to assist clients with:
+
+1. Booking massage appointments
+2. Providing information about services and pricing
+3. Checking availability
+4. Rescheduling or cancelling appointments
+5. Answering questions about policies
+
+Available services:
+""", render_services_block(services)]
+    
+    if deposit_enabled:
+        parts.append("\nSome services require a deposit to confirm the appointment.\n")
+    
+    parts.append("""
+Guidelines:
+- Be warm, welcoming, and professional
+- Ask clarifying questions when needed
+- Keep responses concise but informative
+- Guide clients through the booking process step by step
+- If you cannot help, suggest contacting the business directly
+- Never make up information about availability or pricing
+- Always be helpful and patient
+""")
+    
+    return "".join(parts)
+
+
+def render_dynamic_context(dynamic: Dict) -> str:
+    """Render the per-turn booking state that follows the static prompt"""
+    lines = [f"Current conversation stage: {dynamic.get('booking_stage', 'greeting')}"]
+    
+    for key, label in (("client_name", "Client name"),
+                       ("selected_service", "Selected service"),
+                       ("selected_date", "Selected date"),
+                       ("selected_time", "Selected time")):
+        if dynamic.get(key):
+            lines.append(f"{label}: {dynamic[key]}")
+    
+    return "\n".join(lines)
+
+
+def format_transcript(messages: List[Dict]) -> str:
+    """Render conversation messages as plain text for summarization"""
+    return "\n".join(f"{msg['role'].capitalize()}: {msg['content']}" for msg in messages)
+
+
+# Instruction for condensing older conversation turns
+SUMMARY_PROMPT = (
+    "Summarize this conversation between a client and a massage booking assistant "
+    "in a few sentences. Keep names, requested services, dates, times and any "
+    "unresolved questions. If a previous summary is given, fold it in."
+)
+
+
+# Provider settings read from the environment once at import; later changes are ignored
+_ENV = {key: os.environ.get(key) for key in (
+    "AI_REQUEST_TIMEOUT", "AI_MAX_RETRIES",
+    "OPENAI_API_KEY", "OPENAI_MODEL", "OPENAI_TEMPERATURE",
+    "OPENAI_EMBEDDING_MODEL", "OPENAI_SUMMARY_MODEL",
+    "GROK_API_KEY", "GROK_MODEL", "GROK_TEMPERATURE",
+)}
+
+
+def _env(key: str, default: Optional[str] = None) -> Optional[str]:
+    """Get a provider setting from the import-time environment snapshot"""
+    value = _ENV[key]
+    return default if value is None else value
+
+
+_http_client: Optional["httpx.Client"] = None
+_http_client_lock = threading.Lock()
+
+
+def shared_http_client() -> "httpx.Client":
+    """
+    Get the process-wide HTTP client used by the provider SDKs
+    
+    Sharing one connection pool lets every service reuse keep-alive
+    connections and TLS sessions. Timeouts are set per request by the SDKs.
+    """
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            # Imported here so the rule-based provider never loads it
+            import httpx
+            _http_client = httpx.Client(
+                limits=httpx.Limits(max_keepalive_connections=20, max_connections=100)
+            )
+            atexit.register(_http_client.close)
+        return _http_client
+
+
+_background_executor: Optional[ThreadPoolExecutor] = None
+_background_executor_lock = threading.Lock()
+
+
+def background_executor() -> ThreadPoolExecutor:
+    """Get the process-wide pool for AI work that replies don't wait on"""
+    global _background_executor
+    with _background_executor_lock:
+        if _background_executor is None:
+            _background_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ai-background")
+            atexit.register(_background_executor.shutdown, wait=False)
+        return _background_executor
+
+
+def _reset_background_executor():
+    """Drop the parent's pool in a forked child; its threads did not survive the fork"""
+    global _background_executor, _background_executor_lock
+    _background_executor = None
+    _background_executor_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_background_executor)
+
+
+def _require_sdk(module_name: str, package_label: str):
+    """Fail early if a provider SDK is missing, without paying for its import"""
+    if importlib.util.find_spec(module_name) is None:
+        raise ImportError(f"{package_label} package not installed. Install with: pip install {module_name}")
 
 
 class AIServiceBase(ABC):
     """Abstract base class for AI services"""
     
+    __slots__ = ("api_key", "model", "temperature", "_connection_check")
+    
+    # Seconds a test_connection() result is reused
+    CONNECTION_CHECK_TTL = 60.0
+    # Whether summarize() and embed() are implemented; callers skip the work otherwise
+    SUPPORTS_SUMMARIES = False
+    SUPPORTS_EMBEDDINGS = False
+    
     def __init__(self, api_key: str, model: str, temperature: float = 0.7):
         self.api_key = api_key
         self.model = model
@@ -20,22 +192,87 @@ class AIServiceBase(ABC):
         """Generate a response based on conversation history and context"""
         pass
     
-    @abstractmethod
+    def generate_response_stream(self, messages: List[Dict], context: Optional[Dict] = None) -> Iterator[str]:
+        """
+        Stream a response as it is generated
+        
+        Providers without a streaming API yield the full response as a single chunk.
+        """
+        yield self.generate_response(messages, context)
+    
+    def embed(self, text: str) -> Optional[List[float]]:
+        """
+        Compute an embedding vector for a piece of text
+        
+        Returns:
+            Embedding or None if the provider does not support embeddings
+        """
+        return None
+    
+    def summarize(self, messages: List[Dict], previous_summary: str = "") -> Optional[str]:
+        """
+        Condense conversation messages into a short summary
+        
+        Returns:
+            Summary text or None if the provider does not support summarization
+        """
+        return None
+    
     def test_connection(self) -> bool:
-        """Test if the API connection is working"""
+        """
+        Test if the API connection is working
+        
+        The result is reused for CONNECTION_CHECK_TTL seconds, so repeated
+        health checks don't each make an API call.
+        """
+        now = time.monotonic()
+        cached = getattr(self, "_connection_check", None)
+        if cached is not None and now - cached[1] < self.CONNECTION_CHECK_TTL:
+            return cached[0]
+        
+        result = self._test_connection()
+        self._connection_check = (result, now)
+        return result
+    
+    @abstractmethod
+    def _test_connection(self) -> bool:
+        """Make a minimal API call to check the connection"""
         pass
 
 
 class OpenAIService(AIServiceBase):
     """OpenAI GPT integration for conversation management"""
     
-    def __init__(self, api_key: str, model: str = "gpt-4-turbo-preview", temperature: float = 0.7):
+    __slots__ = ("embedding_model", "summary_model", "_client", "_client_options")
+    
+    SUPPORTS_SUMMARIES = True
+    SUPPORTS_EMBEDDINGS = True
+    
+    def __init__(self, api_key: str, model: str = "gpt-4-turbo-preview", temperature: float = 0.7,
+                 embedding_model: str = "text-embedding-3-small",
+                 request_timeout: float = 8.0, max_retries: int = 1,
+                 summary_model: str = "gpt-4o-mini", http_client=None):
         super().__init__(api_key, model, temperature)
-        try:
+        self.embedding_model = embedding_model
+        self.summary_model = summary_model
+        _require_sdk("openai", "OpenAI")
+        self._client = None
+        self._client_options = dict(
+            api_key=api_key, timeout=request_timeout, max_retries=max_retries,
+            http_client=http_client
+        )
+    
+    @property
+    def client(self):
+        """OpenAI client, created on first use so the SDK is only imported when needed"""
+        if self._client is None:
             import openai
-            self.client = openai.OpenAI(api_key=api_key)
-        except ImportError:
-            raise ImportError("OpenAI package not installed. Install with: pip install openai")
+            self._client = openai.OpenAI(**self._client_options)
+        return self._client
+    
+    @client.setter
+    def client(self, client):
+        self._client = client
     
     def generate_response(self, messages: List[Dict], context: Optional[Dict] = None) -> str:
         """
@@ -49,14 +286,7 @@ class OpenAIService(AIServiceBase):
             Generated response text
         """
         try:
-            # Add system context if available
-            if context:
-                system_context = self._build_system_context(context)
-                if system_context:
-                    messages.insert(0, {
-                        "role": "system",
-                        "content": system_context
-                    })
+            messages = self._with_system_context(messages, context)
             
             response = self.client.chat.completions.create(
                 model=self.model,
@@ -71,6 +301,96 @@ class OpenAIService(AIServiceBase):
             print(f"OpenAI API error: {e}")
             raise Exception(f"Failed to generate response: {str(e)}")
     
+    def generate_response_stream(self, messages: List[Dict], context: Optional[Dict] = None) -> Iterator[str]:
+        """
+        Stream response tokens from OpenAI's API as they arrive
+        
+        Args:
+            messages: List of message dictionaries with 'role' and 'content'
+            context: Additional context about the booking situation
+        
+        Yields:
+            Text chunks of the generated response
+        """
+        try:
+            messages = self._with_system_context(messages, context)
+            
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=self.temperature,
+                max_tokens=500,
+                stream=True
+            )
+            
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+            
+        except Exception as e:
+            print(f"OpenAI API error: {e}")
+            raise Exception(f"Failed to generate response: {str(e)}")
+    
+    def embed(self, text: str) -> Optional[List[float]]:
+        """Compute an embedding using OpenAI's embeddings API"""
+        try:
+            response = self.client.embeddings.create(model=self.embedding_model, input=text)
+            return response.data[0].embedding
+        except Exception as e:
+            print(f"OpenAI embedding error: {e}")
+            return None
+    
+    def summarize(self, messages: List[Dict], previous_summary: str = "") -> Optional[str]:
+        """Summarize older conversation turns with the cheaper summary model"""
+        transcript = format_transcript(messages)
+        if previous_summary:
+            transcript = f"Previous summary: {previous_summary}\n\n{transcript}"
+        
+        try:
+            response = self.client.chat.completions.create(
+                model=self.summary_model,
+                messages=[
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {"role": "user", "content": transcript}
+                ],
+                temperature=0,
+                max_tokens=200
+            )
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            print(f"OpenAI summary error: {e}")
+            return None
+    
+    def _with_system_context(self, messages: List[Dict], context: Optional[Dict]) -> List[Dict]:
+        """
+        Prepend system context to the messages if available
+        
+        A precomputed static prompt is always sent first and unchanged so the
+        prompt prefix is identical across calls; per-turn state and any summary
+        of earlier turns follow it.
+        """
+        if not context:
+            return messages
+        
+        if context.get("static_prompt"):
+            system_messages = [{"role": "system", "content": context["static_prompt"]}]
+            if context.get("dynamic"):
+                system_messages.append({
+                    "role": "system",
+                    "content": render_dynamic_context(context["dynamic"])
+                })
+            if context.get("summary"):
+                system_messages.append({
+                    "role": "system",
+                    "content": "Prior context: " + context["summary"]
+                })
+            return system_messages + messages
+        
+        system_context = self._build_system_context(context)
+        if system_context:
+            return [{"role": "system", "content": system_context}] + messages
+        return messages
+    
     def _build_system_context(self, context: Dict) -> str:
         """Build system context message from booking context"""
         business_name = context.get("business_name", "Massage Therapy")
@@ -90,10 +410,7 @@ Current conversation stage: {booking_stage}
 Available services:
 """
         
-        for service_key, service_info in services.items():
-            system_prompt += f"- {service_info['name']}: {service_info['duration']} min - ${service_info['price']}\n"
-        
-        system_prompt += """
+        guidelines = """
 
 Guidelines:
 - Be warm, welcoming, and professional
@@ -105,9 +422,9 @@ Guidelines:
 - Always be helpful and patient
 """
         
-        return system_prompt
+        return "".join((system_prompt, render_services_block(services, context.get("services_rows")), guidelines))
     
-    def test_connection(self) -> bool:
+    def _test_connection(self) -> bool:
         """Test OpenAI API connection"""
         try:
             response = self.client.chat.completions.create(
@@ -123,15 +440,33 @@ Guidelines:
 class GrokService(AIServiceBase):
     """Grok (xAI) integration for conversation management"""
     
-    def __init__(self, api_key: str, model: str = "grok-1", temperature: float = 0.7):
+    __slots__ = ("_client", "_client_options")
+    
+    SUPPORTS_SUMMARIES = True
+    
+    def __init__(self, api_key: str, model: str = "grok-1", temperature: float = 0.7,
+                 request_timeout: float = 8.0, max_retries: int = 1, http_client=None):
         super().__init__(api_key, model, temperature)
-        try:
+        _require_sdk("anthropic", "Anthropic")
+        self._client = None
+        self._client_options = dict(
+            api_key=api_key, timeout=request_timeout, max_retries=max_retries,
+            http_client=http_client
+        )
+    
+    @property
+    def client(self):
+        """SDK client, created on first use so the SDK is only imported when needed"""
+        if self._client is None:
             import anthropic
             # Note: Using anthropic client for Grok until official SDK is available
             # This is a placeholder - actual Grok integration may require different client
-            self.client = anthropic.Anthropic(api_key=api_key)
-        except ImportError:
-            raise ImportError("Anthropic package not installed. Install with: pip install anthropic")
+            self._client = anthropic.Anthropic(**self._client_options)
+        return self._client
+    
+    @client.setter
+    def client(self, client):
+        self._client = client
     
     def generate_response(self, messages: List[Dict], context: Optional[Dict] = None) -> str:
         """
@@ -145,22 +480,7 @@ class GrokService(AIServiceBase):
             Generated response text
         """
         try:
-            # Convert OpenAI-style messages to Anthropic format
-            # Note: This is a simplified conversion - actual implementation may need adjustment
-            system_message = ""
-            user_messages = []
-            
-            for msg in messages:
-                if msg["role"] == "system":
-                    system_message = msg["content"]
-                elif msg["role"] == "user":
-                    user_messages.append({"role": "user", "content": msg["content"]})
-                elif msg["role"] == "assistant":
-                    user_messages.append({"role": "assistant", "content": msg["content"]})
-            
-            # Add system context if available
-            if context and not system_message:
-                system_message = self._build_system_context(context)
+            system_message, user_messages = self._convert_messages(messages, context)
             
             response = self.client.messages.create(
                 model=self.model,
@@ -176,6 +496,80 @@ class GrokService(AIServiceBase):
             print(f"Grok API error: {e}")
             raise Exception(f"Failed to generate response: {str(e)}")
     
+    def generate_response_stream(self, messages: List[Dict], context: Optional[Dict] = None) -> Iterator[str]:
+        """
+        Stream response text from Grok's API as it arrives
+        
+        Args:
+            messages: List of message dictionaries with 'role' and 'content'
+            context: Additional context about the booking situation
+        
+        Yields:
+            Text chunks of the generated response
+        """
+        try:
+            system_message, user_messages = self._convert_messages(messages, context)
+            
+            with self.client.messages.stream(
+                model=self.model,
+                max_tokens=500,
+                system=system_message,
+                messages=user_messages,
+                temperature=self.temperature
+            ) as stream:
+                for text in stream.text_stream:
+                    yield text
+            
+        except Exception as e:
+            print(f"Grok API error: {e}")
+            raise Exception(f"Failed to generate response: {str(e)}")
+    
+    def summarize(self, messages: List[Dict], previous_summary: str = "") -> Optional[str]:
+        """Summarize older conversation turns"""
+        transcript = format_transcript(messages)
+        if previous_summary:
+            transcript = f"Previous summary: {previous_summary}\n\n{transcript}"
+        
+        try:
+            response = self.client.messages.create(
+                model=self.model,
+                max_tokens=200,
+                system=SUMMARY_PROMPT,
+                messages=[{"role": "user", "content": transcript}],
+                temperature=0
+            )
+            return response.content[0].text.strip()
+        except Exception as e:
+            print(f"Grok summary error: {e}")
+            return None
+    
+    def _convert_messages(self, messages: List[Dict], context: Optional[Dict]):
+        """
+        Convert OpenAI-style messages to Anthropic format
+        
+        Returns:
+            Tuple of (system_message, messages)
+        """
+        # Note: This is a simplified conversion - actual implementation may need adjustment
+        # The last system message wins; user and assistant messages already
+        # have the Anthropic shape and are passed through as they are
+        system_message = next((msg["content"] for msg in reversed(messages) if msg["role"] == "system"), "")
+        user_messages = [msg for msg in messages if msg["role"] in ("user", "assistant")]
+        
+        # Add system context if available
+        if context and not system_message:
+            if context.get("static_prompt"):
+                parts = [context["static_prompt"]]
+                if context.get("dynamic"):
+                    parts.append(render_dynamic_context(context["dynamic"]))
+                if context.get("summary"):
+                    parts.append("Prior context: " + context["summary"])
+                system_message = "\n".join(parts)
+            else:
+                system_message = self._build_system_context(context)
+        
+        return system_message, user_messages
+    
     def _build_system_context(self, context: Dict) -> str:
         """Build system context message from booking context"""
         # Similar to OpenAI implementation
@@ -188,17 +582,14 @@ class GrokService(AIServiceBase):
 Available services:
 """
         
-        for service_key, service_info in services.items():
-            system_prompt += f"- {service_info['name']}: {service_info['duration']} min - ${service_info['price']}\n"
-        
-        system_prompt += f"""
+        footer = f"""
 Current stage: {booking_stage}
 Be helpful, professional, and guide clients through booking.
 """
         
-        return system_prompt
+        return "".join((system_prompt, render_services_block(services, context.get("services_rows")), footer))
     
-    def test_connection(self) -> bool:
+    def _test_connection(self) -> bool:
         """Test Grok API connection"""
         try:
             response = self.client.messages.create(
@@ -211,9 +602,31 @@ Be helpful, professional, and guide clients through booking.
             return False
 
 
+# Rule-based topics in priority order, with the keywords that select them
+_RULE_TOPICS = (
+    ("book", ("book", "appointment")),
+    ("services", ("service", "offer", "menu")),
+    ("pricing", ("price", "cost")),
+    ("cancel", ("cancel",)),
+    ("reschedule", ("reschedule", "change")),
+    ("availability", ("available", "open", "hours")),
+)
+# (keyword, topic) pairs in priority order
+_RULE_KEYWORDS = tuple((keyword, topic) for topic, keywords in _RULE_TOPICS for keyword in keywords)
+_RULE_REPLIES = {
+    "book": "I'd be happy to help you book an appointment! What type of massage are you interested in?",
+    "pricing": "Our prices vary by service type. Would you like me to tell you about our available services and their prices?",
+    "cancel": "I can help you cancel your appointment. Please provide your phone number so I can look up your booking.",
+    "reschedule": "I'd be happy to help you reschedule. Please provide your phone number and your preferred new date and time.",
+    "availability": "I can check availability for you. What date would you like to check?",
+}
+
+
 class RuleBasedService(AIServiceBase):
     """Rule-based fallback when AI is not available"""
     
+    __slots__ = ()
+    
     def __init__(self, api_key: str = "", model: str = "", temperature: float = 0.0):
         # Ignored parameters for rule-based service
         pass
@@ -225,33 +638,21 @@ class RuleBasedService(AIServiceBase):
         
         last_message = messages[-1].get("content", "").lower()
         
-        # Simple rule-based responses
-        if "book" in last_message or "appointment" in last_message:
-            return "I'd be happy to help you book an appointment! What type of massage are you interested in?"
+        # Simple rule-based responses; the earliest topic in _RULE_TOPICS wins
+        topic = next((topic for keyword, topic in _RULE_KEYWORDS if keyword in last_message), None)
+        if topic is None:
+            return "I'm here to help with booking appointments, checking availability, or answering questions about our services. What would you like to do?"
         
-        elif "service" in last_message or "offer" in last_message or "menu" in last_message:
+        if topic == "services":
             services = context.get("services", {}) if context else {}
             if services:
                 service_list = "\n".join([f"• {s['name']}: ${s['price']}" for s in services.values()])
                 return f"Here are our services:\n{service_list}\n\nWhich one would you like to book?"
             return "Please tell me which service you're interested in."
         
-        elif "price" in last_message or "cost" in last_message:
-            return "Our prices vary by service type. Would you like me to tell you about our available services and their prices?"
-        
-        elif "cancel" in last_message:
-            return "I can help you cancel your appointment. Please provide your phone number so I can look up your booking."
-        
-        elif "reschedule" in last_message or "change" in last_message:
-            return "I'd be happy to help you reschedule. Please provide your phone number and your preferred new date and time."
-        
-        elif "available" in last_message or "open" in last_message or "hours" in last_message:
-            return "I can check availability for you. What date would you like to check?"
-        
-        else:
-            return "I'm here to help with booking appointments, checking availability, or answering questions about our services. What would you like to do?"
+        return _RULE_REPLIES[topic]
     
-    def test_connection(self) -> bool:
+    def _test_connection(self) -> bool:
         """Rule-based service always works"""
         return True
 
@@ -262,7 +663,12 @@ class AIServiceFactory:
     @staticmethod
     def create_service(provider: str, config: Dict) -> AIServiceBase:
         """
-        Create an AI service instance based on provider
+        Get an AI service instance for a provider
+        
+        Services are shared between callers passing the same provider and
+        configuration, so their SDK clients and connection pools are reused.
+        Settings from the environment are read once at import (see `_ENV`), so
+        they cannot change underneath a cached service.
         
         Args:
             provider: "openai", "grok", or "rule_based"
@@ -271,27 +677,57 @@ class AIServiceFactory:
         Returns:
             AI service instance
         """
+        try:
+            config_items = tuple(sorted(config.items()))
+            hash(config_items)
+        except TypeError:
+            return AIServiceFactory._create(provider, config)
+        return AIServiceFactory._cached_create(provider.lower(), config_items)
+    
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def _cached_create(provider: str, config_items: Tuple) -> AIServiceBase:
+        """Create a service once per provider and configuration"""
+        return AIServiceFactory._create(provider, dict(config_items))
+    
+    @staticmethod
+    def _create(provider: str, config: Dict) -> AIServiceBase:
+        """Create a new AI service instance"""
         provider = provider.lower()
         
+        # Per-call budget; a stalled request is aborted and retried by the SDK
+        request_timeout = float(config.get("request_timeout", _env("AI_REQUEST_TIMEOUT", "8.0")))
+        max_retries = int(config.get("max_retries", _env("AI_MAX_RETRIES", "1")))
+        
+        # Pooled HTTP client shared by all providers unless one is passed in
+        http_client = config.get("http_client")
+        
         if provider == "openai":
-            api_key = config.get("openai_api_key", os.getenv("OPENAI_API_KEY"))
-            model = config.get("openai_model", os.getenv("OPENAI_MODEL", "gpt-4-turbo-preview"))
-            temperature = float(config.get("openai_temperature", os.getenv("OPENAI_TEMPERATURE", "0.7")))
+            api_key = config.get("openai_api_key", _env("OPENAI_API_KEY"))
+            model = config.get("openai_model", _env("OPENAI_MODEL", "gpt-4-turbo-preview"))
+            temperature = float(config.get("openai_temperature", _env("OPENAI_TEMPERATURE", "0.7")))
+            embedding_model = config.get("openai_embedding_model",
+                                         _env("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small"))
+            summary_model = config.get("openai_summary_model",
+                                       _env("OPENAI_SUMMARY_MODEL", "gpt-4o-mini"))
             
             if not api_key:
                 raise ValueError("OpenAI API key not configured")
             
-            return OpenAIService(api_key, model, temperature)
+            return OpenAIService(api_key, model, temperature, embedding_model,
+                                 request_timeout, max_retries, summary_model,
+                                 http_client or shared_http_client())
         
         elif provider == "grok":
-            api_key = config.get("grok_api_key", os.getenv("GROK_API_KEY"))
-            model = config.get("grok_model", os.getenv("GROK_MODEL", "grok-1"))
-            temperature = float(config.get("grok_temperature", os.getenv("GROK_TEMPERATURE", "0.7")))
+            api_key = config.get("grok_api_key", _env("GROK_API_KEY"))
+            model = config.get("grok_model", _env("GROK_MODEL", "grok-1"))
+            temperature = float(config.get("grok_temperature", _env("GROK_TEMPERATURE", "0.7")))
             
             if not api_key:
                 raise ValueError("Grok API key not configured")
             
-            return GrokService(api_key, model, temperature)
+            return GrokService(api_key, model, temperature, request_timeout, max_retries,
+                               http_client or shared_http_client())
         
         elif provider == "rule_based":
             return RuleBasedService()
@@ -303,6 +739,12 @@ class AIServiceFactory:
 class AIEnhancedBookingAgent:
     """Enhanced booking agent with AI integration"""
     
+    # Recent messages sent verbatim; older ones are folded into a rolling summary
+    HISTORY_WINDOW = 8
+    SUMMARIZE_AFTER = 16
+    # Conversations kept in memory; the least recently active are dropped first
+    MAX_PHONES = 10000
+    
     def __init__(self, provider: str = "openai", config: Optional[Dict] = None):
         """
         Initialize AI-enhanced booking agent
@@ -314,7 +756,12 @@ class AIEnhancedBookingAgent:
         self.config = config or {}
         self.provider = provider
         self.ai_service = AIServiceFactory.create_service(provider, self.config)
-        self.conversation_history: Dict[str, List[Dict]] = {}
+        # Bounded so a failing summarizer can't let history grow without limit
+        self.conversation_history: "OrderedDict[str, Deque[Dict]]" = OrderedDict()
+        self.summaries: Dict[str, str] = {}
+        # Phone numbers with a summary being generated in the background
+        self._summarizing: set = set()
+        self._history_lock = threading.Lock()
     
     def generate_response(self, phone_number: str, user_message: str, 
                          context: Dict, use_ai: bool = True) -> str:
@@ -330,53 +777,152 @@ class AIEnhancedBookingAgent:
         Returns:
             Generated response
         """
+        return "".join(
+            self.generate_response_stream(phone_number, user_message, context, use_ai)
+        ).strip()
+    
+    def generate_response_stream(self, phone_number: str, user_message: str,
+                                 context: Dict, use_ai: bool = True) -> Iterator[str]:
+        """
+        Stream the response to a user message as it is generated
+        
+        Args:
+            phone_number: Client's phone number
+            user_message: User's message
+            context: Booking context (services, stage, etc.)
+            use_ai: Whether to use AI or fall back to rule-based
+        
+        Yields:
+            Text chunks of the generated response
+        """
+        # Get or create conversation history
+        history = self._get_history(phone_number)
+        
+        # Add user message to history
+        history.append({
+            "role": "user",
+            "content": user_message
+        })
+        
+        chunks = []
         try:
-            # Get or create conversation history
-            if phone_number not in self.conversation_history:
-                self.conversation_history[phone_number] = []
-            
-            # Add user message to history
-            self.conversation_history[phone_number].append({
-                "role": "user",
-                "content": user_message
-            })
-            
             # Generate response
             if use_ai and self.provider != "rule_based":
-                response = self.ai_service.generate_response(
-                    self.conversation_history[phone_number],
+                if self.summaries.get(phone_number):
+                    context = {**context, "summary": self.summaries[phone_number]}
+                # The last HISTORY_WINDOW messages (whole turns) plus the new one
+                stream = self.ai_service.generate_response_stream(
+                    list(islice(history, max(0, len(history) - (self.HISTORY_WINDOW + 1)), None)),
                     context
                 )
             else:
-                response = self.ai_service.generate_response(
+                stream = self.ai_service.generate_response_stream(
                     [{"role": "user", "content": user_message}],
                     context
                 )
             
-            # Add assistant response to history
-            self.conversation_history[phone_number].append({
-                "role": "assistant",
-                "content": response
-            })
+            for chunk in stream:
+                chunks.append(chunk)
+                yield chunk
             
-            # Keep history manageable (last 10 messages)
-            if len(self.conversation_history[phone_number]) > 10:
-                self.conversation_history[phone_number] = self.conversation_history[phone_number][-10:]
+        except Exception as e:
+            print(f"Error generating AI response: {e}")
+            # Fall back to rule-based only if nothing has been sent yet
+            if not chunks:
+                if use_ai:
+                    print("Falling back to rule-based response")
+                    history.pop()
+                    yield from self.generate_response_stream(phone_number, user_message, context, use_ai=False)
+                    return
+                chunks.append("I'm having trouble processing your request. Please try again or contact us directly.")
+                yield chunks[-1]
+        
+        self._add_response(phone_number, history, "".join(chunks).strip())
+    
+    def record_turn(self, phone_number: str, user_message: str, response: str):
+        """Add a turn answered without the AI service, such as from a cache, to the history"""
+        history = self._get_history(phone_number)
+        history.append({
+            "role": "user",
+            "content": user_message
+        })
+        self._add_response(phone_number, history, response)
+    
+    def _add_response(self, phone_number: str, history: Deque[Dict], response: str):
+        """Add an assistant response to a history"""
+        history.append({
+            "role": "assistant",
+            "content": response
+        })
+        
+        # Keep history manageable by summarizing older messages, off the request path;
+        # without a summarizer the bounded deque drops them instead
+        if len(history) > self.SUMMARIZE_AFTER and self.ai_service.SUPPORTS_SUMMARIES:
+            with self._history_lock:
+                if phone_number in self._summarizing:
+                    return
+                self._summarizing.add(phone_number)
+            background_executor().submit(self._summarize_history, phone_number, history)
+    
+    def _get_history(self, phone_number: str) -> Deque[Dict]:
+        """Get a phone number's history, evicting the least recently active if full"""
+        with self._history_lock:
+            history = self.conversation_history.get(phone_number)
+            if history is not None:
+                self.conversation_history.move_to_end(phone_number)
+                return history
             
-            return response
+            history = self.conversation_history[phone_number] = deque(maxlen=self.SUMMARIZE_AFTER + 2)
+            while len(self.conversation_history) > self.MAX_PHONES:
+                old_phone, _ = self.conversation_history.popitem(last=False)
+                self.summaries.pop(old_phone, None)
+            return history
+    
+    def _summarize_history(self, phone_number: str, history: Deque[Dict]):
+        """
+        Fold all but the most recent messages into the rolling summary
+        
+        Runs on the background executor. The folded messages stay in the
+        history until their summary is stored, so a failed or empty summary
+        loses nothing; the history's maxlen still bounds it meanwhile.
+        """
+        try:
+            snapshot = list(history)
+            older = snapshot[:len(snapshot) - self.HISTORY_WINDOW]
+            if not older:
+                return
+            
+            summary = self.ai_service.summarize(older, self.summaries.get(phone_number, ""))
+            if not summary:
+                return
             
+            with self._history_lock:
+                self.summaries[phone_number] = summary
+                # New turns may have been appended meanwhile, and the deque's
+                # maxlen may already have dropped some of the folded ones
+                folded = {id(message) for message in older}
+                while history and id(history[0]) in folded:
+                    history.popleft()
         except Exception as e:
-            print(f"Error generating AI response: {e}")
-            # Fall back to rule-based on error
-            if use_ai:
-                print("Falling back to rule-based response")
-                return self.generate_response(phone_number, user_message, context, use_ai=False)
-            return "I'm having trouble processing your request. Please try again or contact us directly."
+            print(f"Error summarizing conversation history: {e}")
+        finally:
+            with self._history_lock:
+                self._summarizing.discard(phone_number)
+    
+    @property
+    def supports_embeddings(self) -> bool:
+        """Whether the provider can embed messages"""
+        return self.ai_service.SUPPORTS_EMBEDDINGS
+    
+    def embed(self, text: str) -> Optional[List[float]]:
+        """Compute an embedding for a message, or None if unsupported"""
+        return self.ai_service.embed(text)
     
     def clear_history(self, phone_number: str):
         """Clear conversation history for a phone number"""
-        if phone_number in self.conversation_history:
-            del self.conversation_history[phone_number]
+        with self._history_lock:
+            self.conversation_history.pop(phone_number, None)
+            self.summaries.pop(phone_number, None)
     
     def test_ai_connection(self) -> bool:
         """Test if AI service is connected and working"""
@@ -0,0 +1,163 @@
+"""
+Bounded in-memory store for per-client conversation state
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Optional
+
+
+class ConversationStore:
+    """
+    LRU map of phone number to conversation state
+
+    Once more than `max_entries` conversations are held, the least recently
+    used one is written to disk and dropped from memory. It is reloaded
+    transparently on the next access. The booking fields go to a small
+    `{phone}.json` header that is replaced atomically, while `messages` are
+    appended to `{phone}.messages.jsonl`, so only turns added since the last
+    write are encoded. The `client` object is not persisted with the state;
+    it is re-attached from the client manager.
+
+    With a `ttl`, conversations idle for longer than `ttl` seconds are
+    archived: dropped from memory and disk, so the client starts afresh.
+    Archiving ignores the conversation stage and a half-finished booking is
+    lost with it, so the TTL is off unless a caller sets one.
+    All access is guarded by a re-entrant lock for threaded servers.
+    """
+
+    def __init__(self, spill_dir: str, client_manager, max_entries: int = 10000,
+                 max_messages: int = 20, ttl: Optional[float] = None):
+        self.spill_dir = spill_dir
+        self.client_manager = client_manager
+        self.max_entries = max_entries
+        self.max_messages = max_messages
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._states: "OrderedDict[str, Dict]" = OrderedDict()
+        # Last access time of each in-memory conversation
+        self._last_access: Dict[str, float] = {}
+        # Number of each conversation's messages already on disk
+        self._persisted_messages: Dict[str, int] = {}
+
+        os.makedirs(spill_dir, exist_ok=True)
+
+    def __contains__(self, phone_number: str) -> bool:
+        with self._lock:
+            self._archive_expired(time.monotonic())
+            # Existence is the whole answer here; nothing is opened afterwards
+            return phone_number in self._states or os.path.exists(self._spill_path(phone_number))
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def get(self, phone_number: str) -> Optional[Dict]:
+        """Get conversation state, reloading it from disk if it was evicted"""
+        with self._lock:
+            self._archive_expired(time.monotonic())
+            state = self._states.get(phone_number)
+            if state is None:
+                state = self._load(phone_number)
+                if state is None:
+                    return None
+                self.put(phone_number, state)
+            else:
+                self._states.move_to_end(phone_number)
+                self._last_access[phone_number] = time.monotonic()
+            return state
+
+    def put(self, phone_number: str, state: Dict):
+        """Store conversation state, evicting the least recently used if full"""
+        with self._lock:
+            now = time.monotonic()
+            self._states[phone_number] = state
+            self._states.move_to_end(phone_number)
+            self._last_access[phone_number] = now
+            self._archive_expired(now)
+
+            while len(self._states) > self.max_entries:
+                old_phone, old_state = self._states.popitem(last=False)
+                self._last_access.pop(old_phone, None)
+                self._spill(old_phone, old_state)
+
+    def pop(self, phone_number: str):
+        """Remove conversation state from memory and disk"""
+        with self._lock:
+            self._states.pop(phone_number, None)
+            self._last_access.pop(phone_number, None)
+            self._persisted_messages.pop(phone_number, None)
+            for path in (self._spill_path(phone_number), self._messages_path(phone_number)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def _archive_expired(self, now: float):
+        """Drop conversations idle for longer than the TTL, oldest first"""
+        if self.ttl is None:
+            return
+        while self._states:
+            phone_number = next(iter(self._states))
+            if now - self._last_access[phone_number] <= self.ttl:
+                break
+            self.pop(phone_number)
+
+    def _spill_path(self, phone_number: str) -> str:
+        return os.path.join(self.spill_dir, f"{phone_number}.json")
+
+    def _messages_path(self, phone_number: str) -> str:
+        return os.path.join(self.spill_dir, f"{phone_number}.messages.jsonl")
+
+    def _spill(self, phone_number: str, state: Dict):
+        """Write an evicted conversation to disk"""
+        header = {key: value for key, value in state.items() if key not in ("client", "messages")}
+        messages = state.get("messages", [])
+        try:
+            persisted = self._persisted_messages.pop(phone_number, 0)
+            if len(messages) > persisted:
+                with open(self._messages_path(phone_number), 'a') as f:
+                    f.writelines(json.dumps(message, separators=(",", ":")) + "\n"
+                                 for message in messages[persisted:])
+
+            tmp_path = self._spill_path(phone_number) + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(header, f, separators=(",", ":"))
+            os.replace(tmp_path, self._spill_path(phone_number))
+        except Exception as e:
+            print(f"Error saving conversation {phone_number}: {e}")
+
+    def _load(self, phone_number: str) -> Optional[Dict]:
+        """Read an evicted conversation back from disk"""
+        spill_path = self._spill_path(phone_number)
+        try:
+            modified = os.path.getmtime(spill_path)
+        except FileNotFoundError:
+            return None
+
+        # Spilled conversations age out like in-memory ones
+        if self.ttl is not None and time.time() - modified > self.ttl:
+            self.pop(phone_number)
+            return None
+
+        try:
+            with open(spill_path, 'r') as f:
+                state = json.load(f)
+            os.remove(spill_path)
+
+            # Keep only the most recent turns in memory
+            messages = deque(maxlen=self.max_messages)
+            try:
+                with open(self._messages_path(phone_number), 'r') as f:
+                    messages.extend(json.loads(line) for line in f if line.strip())
+            except FileNotFoundError:
+                pass
+        except Exception as e:
+            print(f"Error loading conversation {phone_number}: {e}")
+            return None
+
+        state["messages"] = list(messages)
+        state["client"] = self.client_manager.get_or_create_client(phone_number)
+        self._persisted_messages[phone_number] = len(state["messages"])
+        return state
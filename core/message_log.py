@@ -0,0 +1,147 @@
+"""
+Background writer for per-client conversation logs
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Dict, IO, List, Tuple
+
+# Queued to a worker once its writer is garbage collected, so the thread exits
+_STOP = object()
+
+# Writers whose workers are restarted after fork and which are closed at exit
+_live_writers: "weakref.WeakSet[MessageLogWriter]" = weakref.WeakSet()
+
+
+def _restart_writers():
+    """Threads don't survive fork (e.g. gunicorn --preload), so each child starts its own"""
+    for writer in list(_live_writers):
+        writer._start_worker()
+
+
+def _close_writers():
+    """Write out every live writer's queued lines at exit"""
+    for writer in list(_live_writers):
+        writer.close()
+
+
+os.register_at_fork(after_in_child=_restart_writers)
+atexit.register(_close_writers)
+
+
+def _run_worker(writer_ref: "weakref.ref[MessageLogWriter]", work_queue: queue.Queue):
+    """
+    Worker loop: wait for a line, then drain and write the pending batch
+
+    The writer is only referenced weakly while waiting, so an unused writer
+    can be collected; its finalizer then queues _STOP to end the loop.
+    """
+    while True:
+        first = work_queue.get()
+        writer = writer_ref()
+        if first is _STOP or writer is None:
+            work_queue.task_done()
+            return
+
+        batch = [first]
+        deadline = time.monotonic() + writer.flush_interval
+        while len(batch) < writer.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(work_queue.get(timeout=remaining))
+                else:
+                    batch.append(work_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        try:
+            writer._write_batch(batch)
+        except Exception as e:
+            print(f"Error writing message log: {e}")
+        finally:
+            for _ in batch:
+                work_queue.task_done()
+        del writer
+
+
+class MessageLogWriter:
+    """
+    Appends conversation log lines to per-phone files on a background thread
+
+    Callers queue a formatted line and return immediately. The worker drains
+    whatever is pending, waiting up to `flush_interval` seconds after the
+    first line to gather more, and writes it grouped by file. Files are kept open in
+    an LRU of up to `max_open_files` handles, so chatty clients don't reopen
+    their log on every message. Live writers are restarted in forked
+    children and closed at exit by module-level hooks, which hold them weakly.
+    """
+
+    def __init__(self, logs_dir: str, max_batch: int = 256, max_open_files: int = 256,
+                 flush_interval: float = 0.0):
+        self.logs_dir = logs_dir
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_open_files = max_open_files
+        self._finalizer = None
+        self._start_worker()
+        _live_writers.add(self)
+
+    def _start_worker(self):
+        """Start the writer thread with an empty queue and no open files"""
+        self._queue: "queue.Queue[Tuple[str, str]]" = queue.Queue()
+        # Only touched by the worker thread, and by close() once the queue is drained
+        self._handles: "OrderedDict[str, IO]" = OrderedDict()
+        self._worker = threading.Thread(
+            target=_run_worker, args=(weakref.ref(self), self._queue), name="message-log-writer", daemon=True
+        )
+        self._worker.start()
+        if self._finalizer is not None:
+            self._finalizer.detach()
+        self._finalizer = weakref.finalize(self, self._queue.put, _STOP)
+        # At exit _close_writers flushes instead; daemon workers end with the process
+        self._finalizer.atexit = False
+
+    def write(self, phone_number: str, line: str):
+        """Queue a log line for a client"""
+        self._queue.put((phone_number, line))
+
+    def flush(self):
+        """Block until every queued line has been written"""
+        self._queue.join()
+
+    def close(self):
+        """Write any queued lines and close all open log files"""
+        self.flush()
+        while self._handles:
+            _, handle = self._handles.popitem(last=False)
+            handle.close()
+
+    def _get_handle(self, phone_number: str) -> IO:
+        """Get the open log file for a client, closing the least recently used if needed"""
+        handle = self._handles.get(phone_number)
+        if handle is not None:
+            self._handles.move_to_end(phone_number)
+            return handle
+
+        handle = open(os.path.join(self.logs_dir, f"{phone_number}.log"), 'a')
+        self._handles[phone_number] = handle
+        while len(self._handles) > self.max_open_files:
+            _, old_handle = self._handles.popitem(last=False)
+            old_handle.close()
+        return handle
+
+    def _write_batch(self, batch: List[Tuple[str, str]]):
+        """Write a batch of lines, then flush every file it touched"""
+        lines_by_phone: Dict[str, List[str]] = {}
+        for phone_number, line in batch:
+            lines_by_phone.setdefault(phone_number, []).append(line)
+
+        for phone_number, lines in lines_by_phone.items():
+            handle = self._get_handle(phone_number)
+            handle.writelines(lines)
+            handle.flush()
@@ -2,9 +2,67 @@
 Natural Language Understanding module for processing client messages
 """
 import re
+from functools import lru_cache
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
-from config.settings import SERVICES
+from config.settings import (
+    BUSINESS_NAME, BUSINESS_HOURS, SERVICES_MENU_ROWS, SERVICE_MENU,
+    RESCHEDULE_REQUEST, CANCELLATION_POLICY
+)
+
+# Day names in datetime.weekday() order
+_DAY_NAMES = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+# Date, time, name and email patterns, compiled once
+_DIGIT_RE = re.compile(r'\d')
+_DATE_NUMERIC_RE = re.compile(r'(\d{1,2})[\/\-](\d{1,2})[\/\-](\d{4})')
+_DATE_MONTH_DAY_RE = re.compile(
+    r'(january|february|march|april|may|june|july|august|september|october|november|december)\s+(\d{1,2})(?:st|nd|rd|th)?'
+)
+_TIME_HOUR_MINUTE_RE = re.compile(r'(\d{1,2}):(\d{2})\s*(am|pm|a\.m\.|p\.m\.)?')
+_TIME_HOUR_RE = re.compile(r'(\d{1,2})\s*(am|pm|a\.m\.|p\.m\.)')
+_NAME_RES = tuple(re.compile(pattern) for pattern in (
+    r"my name is\s+(\w+)",
+    r"i['']m\s+(\w+)",
+    r"i am\s+(\w+)",
+    r"name['']s\s+(\w+)"
+))
+_EMAIL_RE = re.compile(r'[\w\.-]+@[\w\.-]+\.\w+')
+
+# Price list and business hours replies; settings don't change while running
+_PRICING_MESSAGE = "Here are our prices:\n\n" + "".join(
+    f"• {name}: ${price}\n" for name, duration, price in SERVICES_MENU_ROWS
+)
+_HOURS_MESSAGE = "Our business hours:\n\n" + "".join(
+    f"• {day.capitalize()}: Closed\n" if hours["start"] == "closed"
+    else f"• {day.capitalize()}: {hours['start']} - {hours['end']}\n"
+    for day, hours in BUSINESS_HOURS.items()
+)
+
+# Intents that start a structured flow; they win over a greeting in the same message
+_ACTION_INTENTS = frozenset(("book", "reschedule", "cancel"))
+
+
+def _keyword_pairs(keyword_groups: Dict[str, List[str]]) -> Tuple[Tuple[str, str], ...]:
+    """
+    Flatten grouped keywords into (group, keyword) pairs in priority order
+    
+    A keyword repeated in a later group is dropped, since the earlier group
+    always wins it.
+    """
+    pairs = {}
+    for name, keywords in keyword_groups.items():
+        for keyword in keywords:
+            pairs.setdefault(keyword, name)
+    return tuple((name, keyword) for keyword, name in pairs.items())
+
+
+def _first_group(pairs: Tuple[Tuple[str, str], ...], text: str) -> Optional[str]:
+    """Name of the earliest group with a keyword in the text"""
+    for name, keyword in pairs:
+        if keyword in text:
+            return name
+    return None
 
 
 class NLU:
@@ -32,31 +90,65 @@ class NLU:
             "sports": ["sports", "athlete", "injury", "recovery"],
             "couples": ["couples", "together", "romantic", "two people"]
         }
+        
+        # Greetings must match whole words so "this" or "which" don't read as "hi"
+        self._greeting_re = re.compile(
+            r"\b(?:" + "|".join(re.escape(g) for g in self.intents["greeting"]) + r")\b"
+        )
+        
+        # Substring keywords of the other intents and of the services; the
+        # earliest listed intent or service with a keyword in the message wins
+        self._intent_keywords = _keyword_pairs(
+            {intent: keywords for intent, keywords in self.intents.items() if intent != "greeting"}
+        )
+        self._service_keywords = _keyword_pairs(self.service_keywords)
+        
+        # Parsed messages of the current day; short replies like "yes" or
+        # "tomorrow at 3pm" repeat across conversations
+        self._parse_cached = lru_cache(maxsize=256)(self._parse)
+        
+        # Reply builder for each intent, taking the conversation context
+        self._response_handlers = {
+            "greeting": self._greeting_response,
+            "services": self._services_response,
+            "pricing": self._pricing_response,
+            "hours": self._hours_response,
+            "check_availability": self._check_availability_response,
+            "book": self._book_response,
+            "reschedule": self._reschedule_response,
+            "cancel": self._cancel_response,
+            "help": self._help_response,
+        }
 
-    def classify_intent(self, message: str) -> str:
+    def classify_intent(self, message: str, default_intent: Optional[str] = "book") -> Optional[str]:
         """
         Classify the intent of a user message
         
+        Args:
+            message: The message content
+            default_intent: Intent returned when no keyword matches
+        
         Returns:
             The detected intent
         """
-        message_lower = message.lower()
+        return self._classify_lower(message.lower(), default_intent)
+
+    def _classify_lower(self, message_lower: str, default_intent: Optional[str]) -> Optional[str]:
+        """Classify an already lowercased message"""
+        intent = _first_group(self._intent_keywords, message_lower)
         
-        # Check for greeting first
-        for greeting in self.intents["greeting"]:
-            if greeting in message_lower:
-                return "greeting"
+        # Booking actions outrank a greeting, as in "Hi, I'd like to book"
+        if intent in _ACTION_INTENTS:
+            return intent
         
-        # Check for other intents
-        for intent, keywords in self.intents.items():
-            if intent == "greeting":
-                continue
-            for keyword in keywords:
-                if keyword in message_lower:
-                    return intent
+        # Then greetings, then the other intents
+        if self._greeting_re.search(message_lower):
+            return "greeting"
+        if intent is not None:
+            return intent
         
         # Default to book if no intent detected
-        return "book"
+        return default_intent
 
     def extract_service(self, message: str) -> Optional[str]:
         """
@@ -65,14 +157,7 @@ class NLU:
         Returns:
             Service key or None
         """
-        message_lower = message.lower()
-        
-        for service, keywords in self.service_keywords.items():
-            for keyword in keywords:
-                if keyword in message_lower:
-                    return service
-        
-        return None
+        return _first_group(self._service_keywords, message.lower())
 
     def extract_date(self, message: str) -> Optional[str]:
         """
@@ -81,8 +166,10 @@ class NLU:
         Returns:
             Date in YYYY-MM-DD format or None
         """
-        message_lower = message.lower()
-        
+        return self._extract_date_lower(message.lower())
+
+    def _extract_date_lower(self, message_lower: str) -> Optional[str]:
+        """Extract a date from an already lowercased message"""
         # Today, tomorrow, etc.
         today = datetime.now()
         
@@ -93,19 +180,20 @@ class NLU:
         elif "next week" in message_lower:
             return (today + timedelta(days=7)).strftime("%Y-%m-%d")
         
-        # Day of week
-        days = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
-        for i, day in enumerate(days):
-            if day in message_lower:
-                days_ahead = i - today.weekday()
-                if days_ahead <= 0:
-                    days_ahead += 7
-                return (today + timedelta(days=days_ahead)).strftime("%Y-%m-%d")
+        # Day of week; every name ends in "day", so one scan rules them all out
+        if "day" in message_lower:
+            for i, day in enumerate(_DAY_NAMES):
+                if day in message_lower:
+                    # Days until the next such weekday, 1 to 7 (a week ahead if it's today)
+                    days_ahead = (i - today.weekday() - 1) % 7 + 1
+                    return (today + timedelta(days=days_ahead)).strftime("%Y-%m-%d")
+        
+        # Specific date patterns all need a digit
+        if not _DIGIT_RE.search(message_lower):
+            return None
         
-        # Specific date patterns
         # MM/DD/YYYY or MM-DD-YYYY
-        date_pattern = r'(\d{1,2})[\/\-](\d{1,2})[\/\-](\d{4})'
-        match = re.search(date_pattern, message)
+        match = _DATE_NUMERIC_RE.search(message_lower)
         if match:
             month, day, year = match.groups()
             try:
@@ -115,8 +203,7 @@ class NLU:
                 pass
         
         # Month day (e.g., "January 15")
-        month_pattern = r'(january|february|march|april|may|june|july|august|september|october|november|december)\s+(\d{1,2})(?:st|nd|rd|th)?'
-        match = re.search(month_pattern, message_lower)
+        match = _DATE_MONTH_DAY_RE.search(message_lower)
         if match:
             month_name, day = match.groups()
             try:
@@ -138,11 +225,16 @@ class NLU:
         Returns:
             Time in HH:MM format or None
         """
-        message_lower = message.lower()
+        return self._extract_time_lower(message.lower())
+
+    def _extract_time_lower(self, message_lower: str) -> Optional[str]:
+        """Extract a time from an already lowercased message"""
+        # Both time patterns need a digit
+        if not _DIGIT_RE.search(message_lower):
+            return None
         
         # HH:MM or HH:MM AM/PM
-        time_pattern = r'(\d{1,2}):(\d{2})\s*(am|pm|a\.m\.|p\.m\.)?'
-        match = re.search(time_pattern, message_lower)
+        match = _TIME_HOUR_MINUTE_RE.search(message_lower)
         if match:
             hour, minute, period = match.groups()
             hour = int(hour)
@@ -161,8 +253,7 @@ class NLU:
             return f"{hour:02d}:{minute:02d}"
         
         # HH AM/PM
-        time_pattern = r'(\d{1,2})\s*(am|pm|a\.m\.|p\.m\.)'
-        match = re.search(time_pattern, message_lower)
+        match = _TIME_HOUR_RE.search(message_lower)
         if match:
             hour, period = match.groups()
             hour = int(hour)
@@ -184,20 +275,18 @@ class NLU:
         Returns:
             Name or None
         """
+        return self._extract_name_lower(message, message.lower())
+
+    def _extract_name_lower(self, message: str, message_lower: str) -> Optional[str]:
+        """Extract a name given a message and its lowercased copy"""
         # This is a simple implementation - in production, you'd use NER
-        message_lower = message.lower()
-        words = message.split()
+        # Every pattern contains one of these, and most messages have none
+        if "name" not in message_lower and "i'm" not in message_lower and "i am" not in message_lower:
+            return None
         
         # Look for "my name is" or "I'm" patterns
-        patterns = [
-            r"my name is\s+(\w+)",
-            r"i['']m\s+(\w+)",
-            r"i am\s+(\w+)",
-            r"name['']s\s+(\w+)"
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, message_lower)
+        for pattern in _NAME_RES:
+            match = pattern.search(message_lower)
             if match:
                 name = match.group(1).capitalize()
                 # Check if there's a last name
@@ -216,8 +305,10 @@ class NLU:
         Returns:
             Email address or None
         """
-        email_pattern = r'[\w\.-]+@[\w\.-]+\.\w+'
-        match = re.search(email_pattern, message)
+        if "@" not in message:
+            return None
+        
+        match = _EMAIL_RE.search(message)
         return match.group(0) if match else None
 
     def extract_booking_details(self, message: str) -> Dict[str, any]:
@@ -227,23 +318,41 @@ class NLU:
         Returns:
             Dictionary with extracted information
         """
+        return self._extract_details(message, message.lower())
+
+    def _extract_details(self, message: str, message_lower: str) -> Dict[str, any]:
+        """Extract all booking details given a message and its lowercased copy"""
         return {
-            "service": self.extract_service(message),
-            "date": self.extract_time(message),
-            "time": self.extract_time(message),
-            "name": self.extract_name(message),
+            "service": _first_group(self._service_keywords, message_lower),
+            "date": self._extract_date_lower(message_lower),
+            "time": self._extract_time_lower(message_lower),
+            "name": self._extract_name_lower(message, message_lower),
             "email": self.extract_email(message)
         }
 
-    def parse_booking_request(self, message: str) -> Tuple[str, Dict[str, any]]:
+    def parse_booking_request(self, message: str,
+                              default_intent: Optional[str] = "book") -> Tuple[Optional[str], Dict[str, any]]:
         """
         Parse a booking request and return intent and extracted data
         
+        Args:
+            message: The message content
+            default_intent: Intent returned when no keyword matches
+        
         Returns:
             Tuple of (intent, extracted_data)
         """
-        intent = self.classify_intent(message)
-        extracted_data = self.extract_booking_details(message)
+        # Relative dates depend on the day, so it is part of the cache key
+        intent, extracted_data = self._parse_cached(message, default_intent, datetime.now().toordinal())
+        return intent, dict(extracted_data)
+    
+    def _parse(self, message: str, default_intent: Optional[str],
+               day: int) -> Tuple[Optional[str], Dict[str, any]]:
+        """Classify and extract a message; cached per day by parse_booking_request"""
+        # Lowercase once for the intent and every extractor
+        message_lower = message.lower()
+        intent = self._classify_lower(message_lower, default_intent)
+        extracted_data = self._extract_details(message, message_lower)
         
         return intent, extracted_data
 
@@ -254,61 +363,57 @@ class NLU:
         Returns:
             Response message
         """
-        from config.settings import (
-            BUSINESS_NAME, BUSINESS_HOURS, SERVICES, SERVICE_MENU,
-            BOOKING_CONFIRMATION, RESCHEDULE_REQUEST, CANCELLATION_POLICY
-        )
-        
-        context = context or {}
-        
-        if intent == "greeting":
-            return f"Welcome to {BUSINESS_NAME}! 🌿 How can I help you today? You can book an appointment, check our services, or ask about availability."
-        
-        elif intent == "services":
-            return SERVICE_MENU
-        
-        elif intent == "pricing":
-            price_info = "Here are our prices:\n\n"
-            for key, info in SERVICES.items():
-                price_info += f"• {info['name']}: ${info['price']}\n"
-            return price_info
-        
-        elif intent == "hours":
-            hours_info = f"Our business hours:\n\n"
-            for day, hours in BUSINESS_HOURS.items():
-                if hours['start'] == "closed":
-                    hours_info += f"• {day.capitalize()}: Closed\n"
-                else:
-                    hours_info += f"• {day.capitalize()}: {hours['start']} - {hours['end']}\n"
-            return hours_info
-        
-        elif intent == "check_availability":
-            if context.get("date"):
-                return f"Let me check availability for {context['date']}. Please wait while I retrieve the available slots..."
-            else:
-                return "What date would you like to check availability for? I can show you available time slots for the next 2 weeks."
-        
-        elif intent == "book":
-            if not context.get("service"):
-                return "I'd be happy to help you book an appointment! What type of massage would you like? You can choose from: Swedish, Deep Tissue, Hot Stone, Aromatherapy, Sports, or Couples massage."
-            elif not context.get("date"):
-                return f"Great choice! What date would you like to schedule your {context['service']} massage?"
-            elif not context.get("time"):
-                return f"What time would you prefer on {context['date']}?"
-            else:
-                return f"Perfect! Let me check if {context['date']} at {context['time']} is available for a {context['service']} massage..."
-        
-        elif intent == "reschedule":
-            return RESCHEDULE_REQUEST
-        
-        elif intent == "cancel":
-            if context.get("appointment"):
-                return CANCELLATION_POLICY
-            else:
-                return "I can help you cancel your appointment. Please provide your phone number so I can look up your booking."
-        
-        elif intent == "help":
-            return f"""I can help you with:
+        handler = self._response_handlers.get(intent, self._default_response)
+        return handler(context or {})
+
+    def _greeting_response(self, context: Dict[str, any]) -> str:
+        """Welcome the client"""
+        return f"Welcome to {BUSINESS_NAME}! 🌿 How can I help you today? You can book an appointment, check our services, or ask about availability."
+
+    def _services_response(self, context: Dict[str, any]) -> str:
+        """List the services"""
+        return SERVICE_MENU
+
+    def _pricing_response(self, context: Dict[str, any]) -> str:
+        """List each service's price"""
+        return _PRICING_MESSAGE
+
+    def _hours_response(self, context: Dict[str, any]) -> str:
+        """List the business hours"""
+        return _HOURS_MESSAGE
+
+    def _check_availability_response(self, context: Dict[str, any]) -> str:
+        """Ask for or acknowledge the date to check"""
+        if context.get("date"):
+            return f"Let me check availability for {context['date']}. Please wait while I retrieve the available slots..."
+        else:
+            return "What date would you like to check availability for? I can show you available time slots for the next 2 weeks."
+
+    def _book_response(self, context: Dict[str, any]) -> str:
+        """Ask for the next missing booking detail"""
+        if not context.get("service"):
+            return "I'd be happy to help you book an appointment! What type of massage would you like? You can choose from: Swedish, Deep Tissue, Hot Stone, Aromatherapy, Sports, or Couples massage."
+        elif not context.get("date"):
+            return f"Great choice! What date would you like to schedule your {context['service']} massage?"
+        elif not context.get("time"):
+            return f"What time would you prefer on {context['date']}?"
+        else:
+            return f"Perfect! Let me check if {context['date']} at {context['time']} is available for a {context['service']} massage..."
+
+    def _reschedule_response(self, context: Dict[str, any]) -> str:
+        """Ask for the new date and time"""
+        return RESCHEDULE_REQUEST
+
+    def _cancel_response(self, context: Dict[str, any]) -> str:
+        """Explain the cancellation policy or ask for the booking"""
+        if context.get("appointment"):
+            return CANCELLATION_POLICY
+        else:
+            return "I can help you cancel your appointment. Please provide your phone number so I can look up your booking."
+
+    def _help_response(self, context: Dict[str, any]) -> str:
+        """List what the agent can do"""
+        return f"""I can help you with:
 • Booking a new appointment
 • Checking availability for specific dates
 • Viewing our services and pricing
@@ -316,6 +421,7 @@ class NLU:
 • Payment and deposit information
 
 What would you like to do?"""
-        
-        else:
-            return "I'm here to help! You can ask me to book an appointment, check our services, or check availability. What would you like to know?"
\ No newline at end of file
+
+    def _default_response(self, context: Dict[str, any]) -> str:
+        """Reply to an unrecognized intent"""
+        return "I'm here to help! You can ask me to book an appointment, check our services, or check availability. What would you like to know?"
@@ -1,12 +1,70 @@
 """
 Payment processing module for handling deposits and payments
 """
+import threading
 import stripe
-from typing import Optional, Tuple
+from typing import Dict, Optional, Tuple
 from config.settings import (
-    STRIPE_SECRET_KEY, DEPOSIT_ENABLED, DEPOSIT_REQUEST,
-    BUSINESS_NAME
+    STRIPE_SECRET_KEY, STRIPE_DEPOSIT_PRODUCT_ID, DEPOSIT_ENABLED, DEPOSIT_REQUEST,
+    BUSINESS_NAME, SETTINGS
 )
+from core.scheduler import calculate_deposit
+
+_deposit_product_id: Optional[str] = None
+_deposit_product_lock = threading.Lock()
+
+
+def deposit_product_id() -> str:
+    """
+    Get the Stripe product that deposit prices are created under
+    
+    The product has a fixed ID, so it is looked up once per process and
+    only created the first time the account is used, instead of adding a
+    new product to the account for every booking.
+    """
+    global _deposit_product_id
+    with _deposit_product_lock:
+        if _deposit_product_id is None:
+            try:
+                product = stripe.Product.retrieve(STRIPE_DEPOSIT_PRODUCT_ID)
+            except stripe.InvalidRequestError:
+                product = stripe.Product.create(
+                    id=STRIPE_DEPOSIT_PRODUCT_ID,
+                    name=f"Deposit for {BUSINESS_NAME}"
+                )
+            _deposit_product_id = product.id
+        return _deposit_product_id
+
+
+_deposit_price_ids: Dict[int, str] = {}
+_deposit_price_lock = threading.Lock()
+
+
+def deposit_price_id(amount_cents: int) -> str:
+    """
+    Get the Stripe price for a deposit amount
+    
+    Stripe prices can't change, so every payment link for the same amount
+    shares one. It is found by its lookup key, or created the first time
+    that amount is charged, and then cached for the process.
+    """
+    product_id = deposit_product_id()
+    with _deposit_price_lock:
+        price_id = _deposit_price_ids.get(amount_cents)
+        if price_id is None:
+            lookup_key = f"{product_id}_{amount_cents}"
+            prices = stripe.Price.list(lookup_keys=[lookup_key], limit=1).data
+            if prices:
+                price_id = prices[0].id
+            else:
+                price_id = stripe.Price.create(
+                    product=product_id,
+                    unit_amount=amount_cents,
+                    currency="usd",
+                    lookup_key=lookup_key
+                ).id
+            _deposit_price_ids[amount_cents] = price_id
+        return price_id
 
 
 class PaymentProcessor:
@@ -30,22 +88,12 @@ class PaymentProcessor:
             raise Exception("Stripe is not configured. Please set STRIPE_SECRET_KEY.")
         
         try:
-            # Create product for the deposit
-            product = stripe.Product.create(
-                name=f"Deposit for {BUSINESS_NAME}",
-                description=f"Deposit for appointment {appointment_id[:8]}..."
-            )
-            
-            # Create price
-            price = stripe.Price.create(
-                product=product.id,
-                unit_amount=int(amount * 100),  # Convert to cents
-                currency="usd"
-            )
+            # Shared price for this amount, in cents
+            price_id = deposit_price_id(int(amount * 100))
             
             # Create payment link
             payment_link = stripe.PaymentLink.create(
-                price=price.id,
+                line_items=[{"price": price_id, "quantity": 1}],
                 allow_promotion_codes=True,
                 billing_address_collection="auto",
                 after_completion={
@@ -53,7 +101,8 @@ class PaymentProcessor:
                     "redirect": {
                         "url": f"https://your-website.com/confirmation?appointment_id={appointment_id}"
                     }
-                }
+                },
+                metadata={"appointment_id": appointment_id}
             )
             
             return payment_link.url, payment_link.payment_intent
@@ -162,10 +211,6 @@ class PaymentProcessor:
         Returns:
             Dictionary with deposit information
         """
-        from config.settings import (
-            DEPOSIT_ENABLED, DEPOSIT_REQUIRED_FOR_SERVICES, DEPOSIT_REQUEST
-        )
-        
         if not DEPOSIT_ENABLED:
             return {
                 "required": False,
@@ -173,7 +218,7 @@ class PaymentProcessor:
                 "message": "No deposit required for this appointment."
             }
         
-        if service not in DEPOSIT_REQUIRED_FOR_SERVICES:
+        if service not in SETTINGS.deposit_required_for_services:
             return {
                 "required": False,
                 "amount": 0.0,
@@ -181,9 +226,7 @@ class PaymentProcessor:
             }
         
         # Calculate deposit amount
-        from core.scheduler import Scheduler
-        scheduler = Scheduler(None)
-        deposit_amount = scheduler.calculate_deposit(service, price)
+        deposit_amount = calculate_deposit(service, price)
         
         if deposit_amount <= 0:
             return {
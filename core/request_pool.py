@@ -0,0 +1,68 @@
+"""
+Bounded pool for blocking AI requests
+"""
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Tuple
+
+
+class RequestPool:
+    """
+    Sends AI requests from a fixed pool of workers
+
+    At most `max_workers` requests are in flight against the provider at
+    once, so a burst of messages queues here instead of tripping its rate
+    limit. Messages from the same phone number are sent in arrival order,
+    one at a time, because each call depends on the conversation history of
+    the previous one: each phone number with queued requests has a single
+    pool task draining them.
+    """
+
+    def __init__(self, ai_agent, max_workers: int = 16):
+        self.ai_agent = ai_agent
+        self.max_workers = max_workers
+        self._start_pool()
+        # Threads don't survive fork (e.g. gunicorn --preload), so each child starts its own
+        os.register_at_fork(after_in_child=self._start_pool)
+
+    def _start_pool(self):
+        """Start the worker pool with nothing pending"""
+        # Requests not yet sent, by phone number; a phone number is present while its drain task runs
+        self._pending: "Dict[str, deque[Tuple[str, Dict, Future]]]" = {}
+        self._pending_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ai-request")
+
+    def submit(self, phone_number: str, user_message: str, context: Dict) -> str:
+        """
+        Queue a request behind the phone number's earlier ones and wait for its response
+
+        Returns:
+            Generated response
+        """
+        future: Future = Future()
+        with self._pending_lock:
+            pending = self._pending.get(phone_number)
+            if pending is None:
+                self._pending[phone_number] = deque([(user_message, context, future)])
+                self._pool.submit(self._drain, phone_number)
+            else:
+                pending.append((user_message, context, future))
+        return future.result()
+
+    def _drain(self, phone_number: str):
+        """Send one phone number's requests in order until none are left"""
+        while True:
+            with self._pending_lock:
+                pending = self._pending[phone_number]
+                if not pending:
+                    del self._pending[phone_number]
+                    return
+                user_message, context, future = pending.popleft()
+            try:
+                future.set_result(
+                    self.ai_agent.generate_response(phone_number, user_message, context, use_ai=True)
+                )
+            except Exception as e:
+                future.set_exception(e)
@@ -0,0 +1,111 @@
+"""
+Semantic response cache for reusing AI replies to near-duplicate messages
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+
+class SemanticCache:
+    """
+    In-process cache of AI responses keyed by scope and message embedding
+
+    A scope identifies everything a reply was rendered from besides the
+    message itself (the client and their booking context), so replies are
+    only ever reused within the conversation that produced them. A lookup
+    hits when a cached message in the same scope has a cosine similarity of
+    at least `threshold` with the query embedding. Entries expire `ttl`
+    seconds after insertion and the least recently used entry is evicted
+    once `max_entries` is reached. All access is guarded by a lock.
+    """
+
+    def __init__(self, ttl: float = 3600, threshold: float = 0.92, max_entries: int = 512):
+        self.ttl = ttl
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # (scope, embedding, response, inserted_at) by entry id, least recently used first
+        self._entries: "OrderedDict[int, Tuple[Hashable, List[float], str, float]]" = OrderedDict()
+        # Entry ids of each scope
+        self._by_scope: Dict[Hashable, List[int]] = {}
+        self._next_id = 0
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> List[float]:
+        """Scale an embedding to unit length so cosine similarity is a dot product"""
+        norm = math.sqrt(sum(x * x for x in embedding))
+        if not norm:
+            return list(embedding)
+        return [x / norm for x in embedding]
+
+    def _remove(self, key: int):
+        """Drop one entry and its scope reference"""
+        scope = self._entries.pop(key)[0]
+        keys = self._by_scope[scope]
+        keys.remove(key)
+        if not keys:
+            del self._by_scope[scope]
+
+    def _evict_expired(self, now: float):
+        """Drop expired entries from the least recently used end"""
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry[3] <= self.ttl:
+                break
+            self._remove(key)
+
+    def has_entries(self, scope: Hashable) -> bool:
+        """Whether anything is cached for a scope, so callers can skip embedding the query"""
+        with self._lock:
+            return scope in self._by_scope
+
+    def lookup(self, scope: Hashable, embedding: List[float]) -> Optional[str]:
+        """
+        Find a cached response for a similar message in the same scope
+
+        Returns:
+            Cached response or None
+        """
+        query = self._normalize(embedding)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+
+            best_key, best_score = None, self.threshold
+            for key in list(self._by_scope.get(scope, ())):
+                _, entry_embedding, _, inserted_at = self._entries[key]
+                # Entries refreshed by a hit sit behind the LRU head, so check each one too
+                if now - inserted_at > self.ttl:
+                    self._remove(key)
+                    continue
+                if len(entry_embedding) != len(query):
+                    continue
+                score = sum(a * b for a, b in zip(query, entry_embedding))
+                if score >= best_score:
+                    best_key, best_score = key, score
+
+            if best_key is None:
+                return None
+
+            self._entries.move_to_end(best_key)
+            return self._entries[best_key][2]
+
+    def insert(self, scope: Hashable, embedding: List[float], response: str):
+        """Cache a response for a message embedding"""
+        entry = (scope, self._normalize(embedding), response, time.monotonic())
+        with self._lock:
+            key = self._next_id
+            self._next_id += 1
+            self._entries[key] = entry
+            self._by_scope.setdefault(scope, []).append(key)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        """Remove all cached responses"""
+        with self._lock:
+            self._entries.clear()
+            self._by_scope.clear()
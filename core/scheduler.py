@@ -1,10 +1,113 @@
 """
 Scheduler module for managing appointment availability and time slots
 """
-from datetime import datetime, timedelta
-from typing import List, Dict, Tuple
+from bisect import bisect_left
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from collections import defaultdict
+from typing import Iterable, List, Dict, Tuple
 import calendar
-from config.settings import BUSINESS_HOURS, SERVICES, SLOT_DURATION, MIN_BOOKING_ADVANCE, MAX_BOOKING_ADVANCE
+from config.settings import (
+    BUSINESS_HOURS, BUSINESS_HOURS_PARSED, SERVICES, SLOT_DURATION, MIN_BOOKING_ADVANCE,
+    MAX_BOOKING_ADVANCE, SETTINGS, DEPOSITS_BY_SERVICE
+)
+
+# Lowercase day names by datetime.weekday(), as used in BUSINESS_HOURS
+_WEEKDAY_NAMES = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+# Hours assumed for a day missing from BUSINESS_HOURS, as in get_business_hours
+_DEFAULT_OPENING = time(9, 0)
+_DEFAULT_CLOSING = time(20, 0)
+
+# Opening and closing time by datetime.weekday(), or None when closed
+_HOURS_BY_WEEKDAY = tuple(
+    None if BUSINESS_HOURS.get(day_name, {}).get("start") == "closed"
+    else BUSINESS_HOURS_PARSED.get(day_name, (_DEFAULT_OPENING, _DEFAULT_CLOSING))
+    for day_name in _WEEKDAY_NAMES
+)
+
+# Shortest bookable session; the last slot of the day must leave this much time
+MIN_BOOKING_MINUTES = 60
+
+
+def _to_minutes(time_str: str) -> int:
+    """Convert HH:MM to minutes since midnight"""
+    hours, minutes = time_str.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def _format_minutes(minutes: int) -> str:
+    """Convert minutes since midnight to HH:MM"""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def _available_mask(starts: List[int], durations: List[int], day_start: int, day_end: int,
+                    step: int, min_duration: int = MIN_BOOKING_MINUTES) -> List[bool]:
+    """
+    Compute which slots of a day's grid are free
+    
+    The grid runs from `day_start` in `step`-minute increments while a
+    `min_duration` session still fits before `day_end`. Each slot covers
+    `step` minutes, and any slot an appointment overlaps is marked taken,
+    including appointments that start or end off the grid. All arguments
+    are minutes since midnight or minute counts.
+    
+    Returns:
+        One flag per grid slot, True if free
+    """
+    num_slots = max(0, (day_end - min_duration - day_start) // step + 1)
+    mask = [True] * num_slots
+    
+    for start, duration in zip(starts, durations):
+        offset = start - day_start
+        first = max(0, offset // step)
+        last = min(num_slots, -(-(offset + duration) // step))
+        if first < last:
+            mask[first:last] = [False] * (last - first)
+    
+    return mask
+
+
+@lru_cache(maxsize=64)
+def calculate_deposit(service: str, price: float) -> float:
+    """Calculate the deposit required for a service at a price"""
+    # Deposits at list price are precomputed
+    if price == SERVICES.get(service, {}).get("price"):
+        return DEPOSITS_BY_SERVICE.get(service, 0.0)
+    
+    if not SETTINGS.deposit_enabled:
+        return 0.0
+    
+    # Check if deposit is required for this service
+    if service not in SETTINGS.deposit_required_for_services:
+        return 0.0
+    
+    if SETTINGS.deposit_type == "fixed":
+        return SETTINGS.deposit_amount
+    else:
+        return round(price * SETTINGS.deposit_percentage, 2)
+
+
+def _slot_grid(opening: time, closing: time) -> Tuple[int, int, Tuple[str, ...]]:
+    """
+    Lay out a day's slot grid
+    
+    Returns:
+        Tuple of (opening minute, closing minute, HH:MM of each slot that
+        leaves room for a MIN_BOOKING_MINUTES session)
+    """
+    day_start = opening.hour * 60 + opening.minute
+    day_end = closing.hour * 60 + closing.minute
+    slots = tuple(_format_minutes(minute)
+                  for minute in range(day_start, day_end - MIN_BOOKING_MINUTES + 1, SLOT_DURATION))
+    return day_start, day_end, slots
+
+
+# Slot grid by datetime.weekday(), or None when closed
+_SLOT_GRIDS = tuple(None if hours is None else _slot_grid(*hours) for hours in _HOURS_BY_WEEKDAY)
+
+# Minutes since midnight of every slot label on any grid
+_SLOT_MINUTES = {slot: _to_minutes(slot) for grid in _SLOT_GRIDS if grid for slot in grid[2]}
 
 
 class Scheduler:
@@ -13,14 +116,26 @@ class Scheduler:
     def __init__(self, appointment_manager):
         self.appointment_manager = appointment_manager
 
+    def warm_up(self):
+        """
+        Run the date parsing and formatting paths once
+        
+        The first strptime call imports the _strptime module and compiles its
+        format regexes; doing it here keeps that cost out of the first request.
+        The appointment store is not touched.
+        """
+        tomorrow = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+        self.is_within_business_hours(datetime.strptime(f"{tomorrow} 12:00", "%Y-%m-%d %H:%M"))
+        self.format_date_display(tomorrow)
+        self.format_time_display("12:00")
+
     def is_business_day(self, date: datetime) -> bool:
         """Check if a given date is a business day"""
-        day_name = date.strftime("%A").lower()
-        return BUSINESS_HOURS.get(day_name, {}).get("start") != "closed"
+        return _HOURS_BY_WEEKDAY[date.weekday()] is not None
 
     def get_business_hours(self, date: datetime) -> Tuple[str, str]:
         """Get business hours for a given date"""
-        day_name = date.strftime("%A").lower()
+        day_name = _WEEKDAY_NAMES[date.weekday()]
         hours = BUSINESS_HOURS.get(day_name, {})
         return hours.get("start", "09:00"), hours.get("end", "20:00")
 
@@ -34,15 +149,11 @@ class Scheduler:
 
     def is_within_business_hours(self, requested_datetime: datetime) -> bool:
         """Check if the requested time is within business hours"""
-        if not self.is_business_day(requested_datetime):
+        hours = _HOURS_BY_WEEKDAY[requested_datetime.weekday()]
+        if hours is None:
             return False
         
-        opening, closing = self.get_business_hours(requested_datetime)
-        opening_time = datetime.strptime(opening, "%H:%M").time()
-        closing_time = datetime.strptime(closing, "%H:%M").time()
-        requested_time = requested_datetime.time()
-        
-        return opening_time <= requested_time < closing_time
+        return hours[0] <= requested_datetime.time() < hours[1]
 
     def get_available_slots(self, date_str: str) -> List[str]:
         """Get available time slots for a given date"""
@@ -51,26 +162,45 @@ class Scheduler:
         except ValueError:
             return []
         
-        if not self.is_business_day(date):
+        grid = _SLOT_GRIDS[date.weekday()]
+        if grid is None:
             return []
         
-        opening, closing = self.get_business_hours(date)
-        return self.appointment_manager.get_available_slots(
-            date_str, opening, closing, SLOT_DURATION
+        appointments = self.appointment_manager.get_appointments_by_date(date_str)
+        return [slot for slot, free in zip(grid[2], self._day_mask(grid, appointments)) if free]
+
+    @staticmethod
+    def _day_mask(grid: Tuple[int, int, Tuple[str, ...]], appointments: Iterable) -> List[bool]:
+        """Flag which slots of a day's grid the appointments leave free"""
+        day_start, day_end, _ = grid
+        return _available_mask(
+            [_to_minutes(appt.time) for appt in appointments],
+            [appt.duration for appt in appointments],
+            day_start, day_end, SLOT_DURATION
         )
 
     def get_available_dates(self, days_ahead: int = 14) -> List[str]:
         """Get list of available dates for booking"""
         available_dates = []
-        now = datetime.now()
+        today = datetime.now().toordinal()
+        if days_ahead < 1:
+            return available_dates
+        
+        # Fetch the whole window's appointments at once, grouped by date
+        appointments_by_date = defaultdict(list)
+        for appt in self.appointment_manager.get_appointments_by_date_range(
+                date.fromordinal(today + 1).isoformat(), date.fromordinal(today + days_ahead).isoformat()):
+            appointments_by_date[appt.date].append(appt)
         
-        for i in range(days_ahead):
-            date = now + timedelta(days=i+1)
-            if self.is_business_day(date):
-                date_str = date.strftime("%Y-%m-%d")
-                slots = self.get_available_slots(date_str)
-                if slots:
-                    available_dates.append(date_str)
+        for ordinal in range(today + 1, today + days_ahead + 1):
+            # Day 1 of the proleptic calendar is a Monday, so the weekday is
+            # known from the ordinal without building a date
+            grid = _SLOT_GRIDS[(ordinal - 1) % 7]
+            if grid is None:
+                continue
+            date_str = date.fromordinal(ordinal).isoformat()
+            if any(self._day_mask(grid, appointments_by_date.get(date_str, ()))):
+                available_dates.append(date_str)
         
         return available_dates
 
@@ -115,22 +245,7 @@ class Scheduler:
 
     def calculate_deposit(self, service: str, price: float) -> float:
         """Calculate required deposit amount"""
-        from config.settings import (
-            DEPOSIT_ENABLED, DEPOSIT_AMOUNT, DEPOSIT_PERCENTAGE, 
-            DEPOSIT_TYPE, DEPOSIT_REQUIRED_FOR_SERVICES
-        )
-        
-        if not DEPOSIT_ENABLED:
-            return 0.0
-        
-        # Check if deposit is required for this service
-        if service not in DEPOSIT_REQUIRED_FOR_SERVICES:
-            return 0.0
-        
-        if DEPOSIT_TYPE == "fixed":
-            return DEPOSIT_AMOUNT
-        else:
-            return round(price * DEPOSIT_PERCENTAGE, 2)
+        return calculate_deposit(service, price)
 
     def get_next_available_slot(self, date: str, preferred_time: str = None) -> str:
         """Get the next available time slot, trying preferred time first"""
@@ -152,19 +267,28 @@ class Scheduler:
         if time in available_slots:
             return [time]
         
-        # Sort available slots by proximity to requested time
         try:
             requested_minutes = int(time.split(":")[0]) * 60 + int(time.split(":")[1])
-            
-            def slot_distance(slot):
-                slot_minutes = int(slot.split(":")[0]) * 60 + int(slot.split(":")[1])
-                return abs(slot_minutes - requested_minutes)
-            
-            available_slots.sort(key=slot_distance)
-        except:
-            pass
-        
-        return available_slots[:count]
+        except (AttributeError, IndexError, ValueError):
+            return available_slots[:count]
+        
+        # Slots are in time order, so walk outward from the requested time,
+        # taking the nearer neighbour each step (the earlier one on a tie)
+        minutes = [_SLOT_MINUTES[slot] for slot in available_slots]
+        right = bisect_left(minutes, requested_minutes)
+        left = right - 1
+        suggestions = []
+        while len(suggestions) < count and (left >= 0 or right < len(minutes)):
+            if right == len(minutes) or (
+                left >= 0 and requested_minutes - minutes[left] <= minutes[right] - requested_minutes
+            ):
+                suggestions.append(available_slots[left])
+                left -= 1
+            else:
+                suggestions.append(available_slots[right])
+                right += 1
+        
+        return suggestions
 
     def format_date_display(self, date_str: str) -> str:
         """Format date for display"""
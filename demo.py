@@ -3,6 +3,8 @@ Demo script to showcase the booking agent functionality
 """
 import sys
 import os
+import time
+from functools import lru_cache
 
 # Add current directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -10,6 +12,15 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from agent.booking_agent import BookingAgent
 from datetime import datetime, timedelta
 
+# Pause between messages for realism, skipped when output isn't a terminal or FAST_DEMO is set
+MESSAGE_DELAY = 0.0 if not sys.stdout.isatty() or os.getenv("FAST_DEMO") else 1.0
+
+
+@lru_cache(maxsize=1)
+def _agent():
+    """Booking agent shared by every demo, created on first use"""
+    return BookingAgent()
+
 
 def print_header(title):
     """Print a formatted header"""
@@ -28,7 +39,7 @@ def print_client_message(message):
     print(f"👤 Client: {message}")
 
 
-def simulate_conversation(agent, phone_number, messages):
+def simulate_conversation(agent, phone_number, messages, delay=MESSAGE_DELAY):
     """Simulate a conversation with the agent"""
     print_header("Booking Conversation Simulation")
     
@@ -38,13 +49,13 @@ def simulate_conversation(agent, phone_number, messages):
         print_agent_response(response)
         
         # Add delay for realism
-        import time
-        time.sleep(1)
+        if delay:
+            time.sleep(delay)
 
 
 def demo_basic_booking():
     """Demo basic booking flow"""
-    agent = BookingAgent()
+    agent = _agent()
     phone_number = "5551234567"
     
     messages = [
@@ -61,7 +72,7 @@ def demo_basic_booking():
 
 def demo_with_deposit():
     """Demo booking with deposit requirement"""
-    agent = BookingAgent()
+    agent = _agent()
     phone_number = "5559876543"
     
     print_header("Booking with Deposit Demo")
@@ -76,7 +87,7 @@ def demo_with_deposit():
 
 def demo_check_availability():
     """Demo availability checking"""
-    agent = BookingAgent()
+    agent = _agent()
     
     print_header("Availability Checking Demo")
     
@@ -106,7 +117,7 @@ def demo_check_availability():
 
 def demo_services_info():
     """Demo services information"""
-    agent = BookingAgent()
+    agent = _agent()
     
     print_header("Services Information Demo")
     
@@ -128,7 +139,7 @@ def demo_services_info():
 
 def demo_cancellation():
     """Demo cancellation process"""
-    agent = BookingAgent()
+    agent = _agent()
     phone_number = "5551112222"
     
     print_header("Cancellation Demo")
@@ -148,7 +159,7 @@ def demo_cancellation():
 
 def demo_reschedule():
     """Demo rescheduling process"""
-    agent = BookingAgent()
+    agent = _agent()
     phone_number = "5553334444"
     
     print_header("Rescheduling Demo")
@@ -199,7 +210,7 @@ def demo_nlp_capabilities():
 
 def interactive_demo():
     """Interactive demo where user can chat with the agent"""
-    agent = BookingAgent()
+    agent = _agent()
     
     print_header("Interactive Demo")
     print("Chat with the booking agent! Type 'quit' to exit.\n")
@@ -0,0 +1,22 @@
+"""
+Gunicorn configuration for the booking API
+
+    gunicorn -c gunicorn.conf.py api.flask_app:app
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# Load the agent, clients and appointments once in the master; workers are
+# forked from it and share those pages copy-on-write instead of each
+# reloading them from disk
+preload_app = True
+
+# Conversation state lives in process memory, so a second worker would not
+# see the first one's conversations. Scale with threads, not workers.
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+# Leave room for a slow AI reply
+timeout = 60
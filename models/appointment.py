@@ -1,13 +1,67 @@
 """
 Appointment data model for managing bookings
 """
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Optional, Literal
+from heapq import merge
+from operator import itemgetter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Literal, Tuple
 import json
 import os
+import sqlite3
+import sys
+import threading
+import uuid
 
-@dataclass
+# Columns of the appointments table, in Appointment.to_dict() order
+_COLUMNS = (
+    "id", "client_phone", "service", "date", "time", "duration", "price",
+    "deposit_amount", "deposit_paid", "payment_status", "status", "payment_intent_id",
+    "created_at", "updated_at", "notes", "therapist_preference"
+)
+
+_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS appointments (
+    id TEXT PRIMARY KEY,
+    client_phone TEXT NOT NULL,
+    service TEXT NOT NULL,
+    date TEXT NOT NULL,
+    time TEXT NOT NULL,
+    duration INTEGER NOT NULL,
+    price REAL NOT NULL,
+    deposit_amount REAL NOT NULL,
+    deposit_paid INTEGER NOT NULL,
+    payment_status TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payment_intent_id TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    notes TEXT NOT NULL,
+    therapist_preference TEXT
+)
+"""
+
+_UPSERT = (
+    f"INSERT OR REPLACE INTO appointments ({', '.join(_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(_COLUMNS))})"
+)
+
+# Appointment fields that take few distinct values, interned on load
+_INTERNED_FIELDS = ("service", "status", "payment_status", "date", "time")
+
+# Statuses of appointments that will not take place
+_CLOSED_STATUSES = frozenset(("cancelled", "completed", "no_show"))
+
+
+def _to_minutes(time_str: str) -> int:
+    """Convert HH:MM to minutes since midnight"""
+    hours, minutes = time_str.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+@dataclass(slots=True)
 class Appointment:
     """Represents a massage appointment"""
     id: str
@@ -26,6 +80,9 @@ class Appointment:
     updated_at: datetime = field(default_factory=datetime.now)
     notes: str = ""
     therapist_preference: Optional[str] = None
+    # get_datetime() result and the (date, time) it was parsed from
+    _dt: Optional[datetime] = field(default=None, init=False, repr=False, compare=False)
+    _dt_source: Optional[Tuple[str, str]] = field(default=None, init=False, repr=False, compare=False)
 
     def to_dict(self) -> dict:
         """Convert appointment to dictionary for storage"""
@@ -54,173 +111,329 @@ class Appointment:
         for field in ["created_at", "updated_at"]:
             if data.get(field):
                 data[field] = datetime.fromisoformat(data[field])
+        # Share one string object per distinct value with the literals in
+        # settings and the status sets and with the date index keys, so
+        # comparisons and lookups short-circuit on identity
+        for field in _INTERNED_FIELDS:
+            if data.get(field):
+                data[field] = sys.intern(data[field])
         return cls(**data)
 
-    def mark_deposit_paid(self, payment_intent_id: str):
+    def mark_deposit_paid(self, payment_intent_id: str, now: Optional[datetime] = None):
         """Mark deposit as paid"""
         self.deposit_paid = True
         self.payment_status = "deposit_paid"
         self.payment_intent_id = payment_intent_id
         self.status = "confirmed"
-        self.updated_at = datetime.now()
+        self.updated_at = now or datetime.now()
 
-    def cancel(self):
+    def cancel(self, now: Optional[datetime] = None):
         """Cancel the appointment"""
         self.status = "cancelled"
-        self.updated_at = datetime.now()
+        self.updated_at = now or datetime.now()
 
-    def complete(self):
+    def complete(self, now: Optional[datetime] = None):
         """Mark appointment as completed"""
         self.status = "completed"
         self.payment_status = "fully_paid"
-        self.updated_at = datetime.now()
+        self.updated_at = now or datetime.now()
 
     def get_datetime(self) -> datetime:
-        """Get appointment as datetime object"""
-        return datetime.strptime(f"{self.date} {self.time}", "%Y-%m-%d %H:%M")
+        """Get appointment as datetime object, parsed again only after date or time changes"""
+        source = (self.date, self.time)
+        if self._dt_source != source:
+            self._dt = datetime.strptime(f"{self.date} {self.time}", "%Y-%m-%d %H:%M")
+            self._dt_source = source
+        return self._dt
 
 
 class AppointmentManager:
-    """Manages appointment storage and retrieval"""
+    """
+    Manages appointment storage and retrieval
+    
+    Appointments are held in memory and written through to a SQLite database
+    one row at a time. An existing appointments.json is imported the first
+    time the database is created. The in-memory list and its lookup indexes
+    are read and changed under one re-entrant lock, so threaded workers
+    never see them out of step.
+    """
     
     def __init__(self, data_dir: str):
         self.data_dir = data_dir
         self.appointments_file = os.path.join(data_dir, "appointments.json")
+        self.db_file = os.path.join(data_dir, "appointments.db")
+        self._db_lock = threading.Lock()
+        self._index_lock = threading.RLock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid: Optional[int] = None
         self._ensure_data_dir()
         self._load_appointments()
 
     def _ensure_data_dir(self):
         """Create data directory if it doesn't exist"""
-        if not os.path.exists(self.data_dir):
-            os.makedirs(self.data_dir)
+        os.makedirs(self.data_dir, exist_ok=True)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get the database connection, opening a new one in a forked process"""
+        if self._db is None or self._db_pid != os.getpid():
+            conn = sqlite3.connect(self.db_file, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(_CREATE_TABLE)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_appointments_payment_intent "
+                         "ON appointments (payment_intent_id)")
+            self._db = conn
+            self._db_pid = os.getpid()
+        return self._db
 
     def _load_appointments(self):
-        """Load appointments from file"""
+        """Load appointments from the database, importing appointments.json on first run"""
         self.appointments = []
-        if os.path.exists(self.appointments_file):
+        try:
+            data = None
+            # sqlite3.connect creates the database file, so whether this is a
+            # first run has to be checked up front; the upsert below makes a
+            # second process importing the same file harmless.
+            if not os.path.exists(self.db_file):
+                try:
+                    with open(self.appointments_file, 'r') as f:
+                        data = json.load(f)
+                except FileNotFoundError:
+                    pass
+            with self._db_lock:
+                conn = self._connection()
+                if data is not None:
+                    conn.execute("BEGIN")
+                    conn.executemany(_UPSERT, [self._to_row(Appointment.from_dict(appt)) for appt in data])
+                    conn.execute("COMMIT")
+                
+                rows = conn.execute(
+                    f"SELECT {', '.join(_COLUMNS)} FROM appointments ORDER BY created_at"
+                ).fetchall()
+            appointments = [self._from_row(row) for row in rows]
+        except Exception as e:
+            print(f"Error loading appointments: {e}")
+            appointments = []
+        
+        with self._index_lock:
+            self.appointments = appointments
+            self._rebuild_indexes()
+
+    @staticmethod
+    def _to_row(appointment: Appointment) -> tuple:
+        """Convert an appointment to a database row"""
+        data = appointment.to_dict()
+        return tuple(data[column] for column in _COLUMNS)
+
+    @staticmethod
+    def _from_row(row: tuple) -> Appointment:
+        """Create an appointment from a database row"""
+        data = dict(zip(_COLUMNS, row))
+        data["deposit_paid"] = bool(data["deposit_paid"])
+        return Appointment.from_dict(data)
+
+    def _rebuild_indexes(self):
+        """Build lookup indexes from the appointment list"""
+        self._by_payment_intent: Dict[str, Appointment] = {}
+        # Keys each appointment is currently indexed under, by appointment id
+        self._indexed_payment_intent: Dict[str, str] = {}
+        # Each client's appointments by status, in creation order
+        self._by_phone_status: Dict[Tuple[str, str], List[Appointment]] = defaultdict(list)
+        self._indexed_phone_status: Dict[str, Tuple[str, str]] = {}
+        self._by_id: Dict[str, Appointment] = {}
+        # Each date's appointments, in creation order
+        self._by_date: Dict[str, List[Appointment]] = defaultdict(list)
+        self._indexed_date: Dict[str, str] = {}
+        # Keys of _by_date, in order, for range queries
+        self._sorted_dates: List[str] = []
+        # (start, created_at, id) of appointments that may still take place, in start order
+        self._open_by_start: List[Tuple[datetime, datetime, str]] = []
+        self._indexed_start: Dict[str, Tuple[datetime, datetime, str]] = {}
+        # Appointments whose deposit is still owed, by appointment id
+        self._pending_deposit: Dict[str, Appointment] = {}
+        for appt in self.appointments:
+            self._index_appointment(appt)
+
+    def _index_appointment(self, appointment: Appointment):
+        """Add an appointment to the lookup indexes, replacing any stale entries"""
+        self._unindex_appointment(appointment)
+        if appointment.payment_intent_id:
+            self._by_payment_intent[appointment.payment_intent_id] = appointment
+            self._indexed_payment_intent[appointment.id] = appointment.payment_intent_id
+        
+        key = (appointment.client_phone, appointment.status)
+        insort(self._by_phone_status[key], appointment, key=lambda appt: appt.created_at)
+        self._indexed_phone_status[appointment.id] = key
+        
+        self._by_id[appointment.id] = appointment
+        if appointment.date not in self._by_date:
+            insort(self._sorted_dates, appointment.date)
+        insort(self._by_date[appointment.date], appointment, key=lambda appt: appt.created_at)
+        self._indexed_date[appointment.id] = appointment.date
+        
+        if appointment.status not in _CLOSED_STATUSES:
             try:
-                with open(self.appointments_file, 'r') as f:
-                    data = json.load(f)
-                    self.appointments = [Appointment.from_dict(appt) for appt in data]
-            except Exception as e:
-                print(f"Error loading appointments: {e}")
-                self.appointments = []
-
-    def _save_appointments(self):
-        """Save appointments to file"""
+                entry = (appointment.get_datetime(), appointment.created_at, appointment.id)
+            except ValueError as e:
+                print(f"Not listing appointment {appointment.id} as upcoming: {e}")
+            else:
+                insort(self._open_by_start, entry)
+                self._indexed_start[appointment.id] = entry
+        
+        if (appointment.deposit_amount > 0 and appointment.payment_status == "pending"
+                and appointment.status not in _CLOSED_STATUSES):
+            self._pending_deposit[appointment.id] = appointment
+
+    def _unindex_appointment(self, appointment: Appointment):
+        """Remove an appointment from the lookup indexes"""
+        payment_intent_id = self._indexed_payment_intent.pop(appointment.id, None)
+        if payment_intent_id is not None:
+            self._by_payment_intent.pop(payment_intent_id, None)
+        
+        self._pending_deposit.pop(appointment.id, None)
+        
+        self._by_id.pop(appointment.id, None)
+        
+        key = self._indexed_phone_status.pop(appointment.id, None)
+        if key is not None:
+            self._remove_from_bucket(self._by_phone_status, key, appointment.id)
+        
+        date = self._indexed_date.pop(appointment.id, None)
+        if date is not None:
+            self._remove_from_bucket(self._by_date, date, appointment.id)
+            if date not in self._by_date:
+                del self._sorted_dates[bisect_left(self._sorted_dates, date)]
+        
+        entry = self._indexed_start.pop(appointment.id, None)
+        if entry is not None:
+            del self._open_by_start[bisect_left(self._open_by_start, entry)]
+
+    @staticmethod
+    def _remove_from_bucket(index: Dict[Any, List[Appointment]], key: Any, appointment_id: str):
+        """Remove an appointment from one bucket of an index, dropping the bucket once empty"""
+        bucket = index[key]
+        for i, appt in enumerate(bucket):
+            if appt.id == appointment_id:
+                del bucket[i]
+                break
+        if not bucket:
+            del index[key]
+
+    def _save_appointment(self, appointment: Appointment):
+        """Write one appointment to the database"""
         try:
-            data = [appt.to_dict() for appt in self.appointments]
-            with open(self.appointments_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            with self._db_lock:
+                self._connection().execute(_UPSERT, self._to_row(appointment))
         except Exception as e:
-            print(f"Error saving appointments: {e}")
+            print(f"Error saving appointment {appointment.id}: {e}")
 
     def create_appointment(self, **kwargs) -> Appointment:
         """Create a new appointment"""
-        import uuid
         kwargs["id"] = str(uuid.uuid4())
         appointment = Appointment(**kwargs)
-        self.appointments.append(appointment)
-        self._save_appointments()
+        with self._index_lock:
+            self.appointments.append(appointment)
+            self._index_appointment(appointment)
+        self._save_appointment(appointment)
         return appointment
 
     def update_appointment(self, appointment: Appointment):
         """Update an existing appointment"""
-        for i, appt in enumerate(self.appointments):
-            if appt.id == appointment.id:
-                self.appointments[i] = appointment
-                self._save_appointments()
+        with self._index_lock:
+            existing = self._by_id.get(appointment.id)
+            if existing is None:
                 return
+            
+            # Callers usually pass back the object they looked up and changed in
+            # place; only a replacement object has to be swapped into the list
+            if existing is not appointment:
+                position = next(i for i, appt in enumerate(self.appointments) if appt is existing)
+                self.appointments[position] = appointment
+            self._index_appointment(appointment)
+        self._save_appointment(appointment)
 
     def get_appointment_by_id(self, appointment_id: str) -> Optional[Appointment]:
         """Get appointment by ID"""
-        for appt in self.appointments:
-            if appt.id == appointment_id:
-                return appt
-        return None
+        return self._by_id.get(appointment_id)
+
+    def get_appointment_by_payment_intent(self, payment_intent_id: str) -> Optional[Appointment]:
+        """Get appointment by Stripe payment intent ID"""
+        with self._index_lock:
+            appointment = self._by_payment_intent.get(payment_intent_id)
+            if appointment is not None:
+                return appointment
+            
+            # The ID may have been set on the object without update_appointment;
+            # only appointments still awaiting a deposit can be missing
+            for appt in list(self._pending_deposit.values()):
+                if appt.payment_intent_id == payment_intent_id:
+                    self._index_appointment(appt)
+                    return appt
+            return None
+
+    @property
+    def pending_deposit_appointments(self) -> list[Appointment]:
+        """Appointments whose deposit has not been paid yet"""
+        with self._index_lock:
+            return list(self._pending_deposit.values())
 
     def get_client_appointments(self, phone_number: str) -> list[Appointment]:
         """Get all appointments for a client"""
-        return [appt for appt in self.appointments if appt.client_phone == phone_number]
+        with self._index_lock:
+            return [appt for appt in self.appointments if appt.client_phone == phone_number]
+
+    def get_client_appointments_by_status(self, phone_number: str,
+                                          statuses: Iterable[str]) -> Iterator[Appointment]:
+        """Iterate over a client's appointments with any of the given statuses, oldest first"""
+        # Buckets are copied so the merge can run after the lock is released
+        with self._index_lock:
+            buckets = [list(self._by_phone_status[(phone_number, status)])
+                       for status in statuses if (phone_number, status) in self._by_phone_status]
+        return merge(*buckets, key=lambda appt: appt.created_at)
 
     def get_appointments_by_date(self, date: str) -> list[Appointment]:
         """Get all appointments for a specific date"""
-        return [appt for appt in self.appointments if appt.date == date and appt.status != "cancelled"]
+        with self._index_lock:
+            return [appt for appt in self._by_date.get(date, ()) if appt.status != "cancelled"]
 
     def get_appointments_by_date_range(self, start_date: str, end_date: str) -> list[Appointment]:
-        """Get appointments within a date range"""
+        """Get appointments within a date range, by date and then in creation order"""
         appointments = []
-        for appt in self.appointments:
-            if appt.status == "cancelled":
-                continue
-            if start_date <= appt.date <= end_date:
-                appointments.append(appt)
+        with self._index_lock:
+            first = bisect_left(self._sorted_dates, start_date)
+            last = bisect_right(self._sorted_dates, end_date)
+            for date in self._sorted_dates[first:last]:
+                appointments.extend(appt for appt in self._by_date[date] if appt.status != "cancelled")
         return appointments
 
     def check_availability(self, date: str, time: str, duration: int) -> bool:
         """Check if a time slot is available"""
-        existing_appointments = self.get_appointments_by_date(date)
-        
-        start_time = datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M")
-        end_time = start_time + datetime.timedelta(minutes=duration)
+        start = _to_minutes(time)
+        end = start + duration
         
-        for appt in existing_appointments:
-            appt_start = datetime.strptime(f"{appt.date} {appt.time}", "%Y-%m-%d %H:%M")
-            appt_end = appt_start + datetime.timedelta(minutes=appt.duration)
+        for appt in self.get_appointments_by_date(date):
+            appt_start = _to_minutes(appt.time)
             
             # Check for overlap
-            if not (end_time <= appt_start or start_time >= appt_end):
+            if start < appt_start + appt.duration and appt_start < end:
                 return False
         
         return True
 
-    def get_available_slots(self, date: str, opening_time: str, closing_time: str, 
-                           slot_duration: int) -> list[str]:
-        """Get available time slots for a given date"""
-        import datetime as dt
-        
-        existing_appointments = self.get_appointments_by_date(date)
-        booked_slots = set()
-        
-        # Mark booked time slots
-        for appt in existing_appointments:
-            appt_start = dt.datetime.strptime(f"{appt.date} {appt.time}", "%Y-%m-%d %H:%M")
-            appt_end = appt_start + dt.timedelta(minutes=appt.duration)
-            
-            current = appt_start
-            while current < appt_end:
-                booked_slots.add(current.strftime("%H:%M"))
-                current += dt.timedelta(minutes=slot_duration)
-
-        # Generate all possible slots
-        open_time = dt.datetime.strptime(opening_time, "%H:%M")
-        close_time = dt.datetime.strptime(closing_time, "%H:%M")
-        
-        available_slots = []
-        current = open_time
-        while current + dt.timedelta(minutes=60) <= close_time:  # Minimum 60 min booking
-            time_str = current.strftime("%H:%M")
-            if time_str not in booked_slots:
-                available_slots.append(time_str)
-            current += dt.timedelta(minutes=slot_duration)
-        
-        return available_slots
-
-    def cancel_appointment(self, appointment_id: str) -> bool:
-        """Cancel an appointment"""
-        appointment = self.get_appointment_by_id(appointment_id)
-        if appointment:
-            appointment.cancel()
-            self._save_appointments()
-            return True
-        return False
+    def cancel_appointment(self, appointment_id: str, now: Optional[datetime] = None) -> bool:
+        """Cancel an appointment; callers cancelling several can pass one shared timestamp"""
+        with self._index_lock:
+            appointment = self._by_id.get(appointment_id)
+            if appointment is None:
+                return False
+            appointment.cancel(now)
+            self._index_appointment(appointment)
+        self._save_appointment(appointment)
+        return True
 
     def get_upcoming_appointments(self) -> list[Appointment]:
         """Get all upcoming appointments"""
         now = datetime.now()
-        upcoming = []
-        for appt in self.appointments:
-            if appt.status not in ["cancelled", "completed", "no_show"]:
-                if appt.get_datetime() > now:
-                    upcoming.append(appt)
-        return sorted(upcoming, key=lambda x: x.get_datetime())
\ No newline at end of file
+        with self._index_lock:
+            first = bisect_right(self._open_by_start, now, key=itemgetter(0))
+            return [self._by_id[appt_id] for _, _, appt_id in self._open_by_start[first:]]
@@ -3,11 +3,39 @@ Client data model for managing customer information
 """
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Optional, List
+from functools import lru_cache
+from typing import Dict, Optional, List
 import json
 import os
+import sqlite3
+import threading
+
+_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS clients (
+    phone_number TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+)
+"""
+
+_UPSERT = "INSERT OR REPLACE INTO clients (phone_number, data) VALUES (?, ?)"
+
+
+def _to_json(data: dict) -> str:
+    """Encode a stored client record as compact JSON"""
+    return json.dumps(data, separators=(",", ":"))
+
+
+# Separator characters removed from phone numbers
+_PHONE_STRIP = str.maketrans("", "", "- \t")
+
 
-@dataclass
+@lru_cache(maxsize=8192)
+def normalize_phone(phone_number: str) -> str:
+    """Strip separators from a phone number in a single pass; repeat callers hit the cache"""
+    return phone_number.strip().translate(_PHONE_STRIP)
+
+
+@dataclass(slots=True)
 class Client:
     """Represents a massage parlor client"""
     phone_number: str
@@ -45,17 +73,17 @@ class Client:
         """Add or update a client preference"""
         self.preferences[key] = value
 
-    def add_note(self, note: str):
+    def add_note(self, note: str, now: Optional[datetime] = None):
         """Add a note to the client record"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        timestamp = (now or datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
         self.notes.append(f"{timestamp}: {note}")
 
-    def add_payment_method(self, method_type: str, last_four: str):
+    def add_payment_method(self, method_type: str, last_four: str, now: Optional[datetime] = None):
         """Add a payment method to client record"""
         self.payment_methods.append({
             "type": method_type,
             "last_four": last_four,
-            "added_at": datetime.now().isoformat()
+            "added_at": (now or datetime.now()).isoformat()
         })
 
     def increment_appointments(self, amount: float):
@@ -65,65 +93,111 @@ class Client:
 
 
 class ClientManager:
-    """Manages client data storage and retrieval"""
+    """
+    Manages client data storage and retrieval
+    
+    Clients are held in memory and written through to a SQLite database one
+    row at a time. An existing clients.json is imported the first time the
+    database is created.
+    """
     
     def __init__(self, data_dir: str):
         self.data_dir = data_dir
         self.clients_file = os.path.join(data_dir, "clients.json")
+        self.db_file = os.path.join(data_dir, "clients.db")
+        self._db_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid: Optional[int] = None
         self._ensure_data_dir()
         self._load_clients()
 
     def _ensure_data_dir(self):
         """Create data directory if it doesn't exist"""
-        if not os.path.exists(self.data_dir):
-            os.makedirs(self.data_dir)
+        os.makedirs(self.data_dir, exist_ok=True)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get the database connection, opening a new one in a forked process"""
+        if self._db is None or self._db_pid != os.getpid():
+            conn = sqlite3.connect(self.db_file, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(_CREATE_TABLE)
+            self._db = conn
+            self._db_pid = os.getpid()
+        return self._db
 
     def _load_clients(self):
-        """Load clients from file"""
+        """Load clients from the database, importing clients.json on first run"""
         self.clients = {}
-        if os.path.exists(self.clients_file):
-            try:
-                with open(self.clients_file, 'r') as f:
-                    data = json.load(f)
-                    for phone, client_data in data.items():
-                        self.clients[phone] = Client.from_dict(client_data)
-            except Exception as e:
-                print(f"Error loading clients: {e}")
-                self.clients = {}
-
-    def _save_clients(self):
-        """Save clients to file"""
+        # Lowercased name of each named client, by phone number, for search
+        self._names_lower: Dict[str, str] = {}
+        try:
+            data = None
+            # Checked before connecting, which would create the database file
+            if not os.path.exists(self.db_file):
+                try:
+                    with open(self.clients_file, 'r') as f:
+                        data = json.load(f)
+                except FileNotFoundError:
+                    pass
+            with self._db_lock:
+                conn = self._connection()
+                if data is not None:
+                    conn.execute("BEGIN")
+                    conn.executemany(_UPSERT, [(phone, _to_json(client_data))
+                                               for phone, client_data in data.items()])
+                    conn.execute("COMMIT")
+                
+                rows = conn.execute("SELECT phone_number, data FROM clients").fetchall()
+            for phone, client_data in rows:
+                self.clients[phone] = Client.from_dict(json.loads(client_data))
+        except Exception as e:
+            print(f"Error loading clients: {e}")
+            self.clients = {}
+        
+        for client in self.clients.values():
+            self._index_name(client)
+
+    def _index_name(self, client: Client):
+        """Record a client's lowercased name for search"""
+        if client.name:
+            self._names_lower[client.phone_number] = client.name.lower()
+        else:
+            self._names_lower.pop(client.phone_number, None)
+
+    def _save_client(self, client: Client):
+        """Write one client to the database"""
         try:
-            data = {phone: client.to_dict() for phone, client in self.clients.items()}
-            with open(self.clients_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            with self._db_lock:
+                self._connection().execute(_UPSERT, (client.phone_number, _to_json(client.to_dict())))
         except Exception as e:
-            print(f"Error saving clients: {e}")
+            print(f"Error saving client {client.phone_number}: {e}")
 
     def get_or_create_client(self, phone_number: str) -> Client:
         """Get existing client or create new one"""
-        phone_number = phone_number.strip().replace("-", "").replace(" ", "")
+        phone_number = normalize_phone(phone_number)
         
         if phone_number not in self.clients:
             self.clients[phone_number] = Client(phone_number=phone_number)
-            self._save_clients()
+            self._save_client(self.clients[phone_number])
         
         return self.clients[phone_number]
 
     def update_client(self, client: Client):
         """Update client information"""
         self.clients[client.phone_number] = client
-        self._save_clients()
+        self._index_name(client)
+        self._save_client(client)
 
     def get_client_by_phone(self, phone_number: str) -> Optional[Client]:
         """Get client by phone number"""
-        phone_number = phone_number.strip().replace("-", "").replace(" ", "")
+        phone_number = normalize_phone(phone_number)
         return self.clients.get(phone_number)
 
     def search_clients(self, name: str) -> List[Client]:
         """Search clients by name"""
         name_lower = name.lower()
         return [
-            client for client in self.clients.values()
-            if client.name and name_lower in client.name.lower()
+            self.clients[phone] for phone, client_name in self._names_lower.items()
+            if name_lower in client_name
         ]
\ No newline at end of file
@@ -0,0 +1,36 @@
+"""
+Shared fixtures; every agent and manager writes to a temporary directory
+"""
+import pytest
+
+import agent.ai_booking_agent as ai_booking_agent_module
+import agent.booking_agent as booking_agent_module
+from agent.ai_booking_agent import AIBookingAgent
+from agent.booking_agent import BookingAgent
+from models.appointment import AppointmentManager
+from models.client import ClientManager
+
+
+@pytest.fixture
+def data_dirs(tmp_path, monkeypatch):
+    """Point the agents' data and log directories at tmp_path"""
+    data_dir = str(tmp_path / "data")
+    logs_dir = str(tmp_path / "logs")
+    for module in (booking_agent_module, ai_booking_agent_module):
+        monkeypatch.setattr(module, "DATA_DIR", data_dir)
+        monkeypatch.setattr(module, "LOGS_DIR", logs_dir)
+    return data_dir, logs_dir
+
+
+@pytest.fixture
+def booking_agent(data_dirs):
+    data_dir, _ = data_dirs
+    return BookingAgent(
+        client_manager=ClientManager(data_dir),
+        appointment_manager=AppointmentManager(data_dir),
+    )
+
+
+@pytest.fixture
+def ai_booking_agent(data_dirs):
+    return AIBookingAgent("rule_based")
@@ -0,0 +1,14 @@
+from agent.ai_booking_agent import AIBookingAgent
+
+
+def test_greeting_with_booking_request_enters_structured_flow(ai_booking_agent):
+    ai_booking_agent.process_message("+15550100", "Hi, I'd like to book a massage")
+    
+    state = ai_booking_agent.conversations.get("+15550100")
+    assert state["stage"] != "greeting"
+
+
+def test_rule_based_provider_never_embeds_for_the_cache(data_dirs, monkeypatch):
+    monkeypatch.setenv("AI_RESPONSE_CACHE", "true")
+    
+    assert AIBookingAgent("rule_based").response_cache is None
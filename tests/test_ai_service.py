@@ -0,0 +1,14 @@
+import core.ai_service as ai_service
+from core.ai_service import AIEnhancedBookingAgent
+
+
+def test_rule_based_history_is_not_queued_for_summaries(monkeypatch):
+    def fail():
+        raise AssertionError("summary scheduled without a summarizer")
+    monkeypatch.setattr(ai_service, "background_executor", fail)
+    agent = AIEnhancedBookingAgent("rule_based")
+    
+    for i in range(AIEnhancedBookingAgent.SUMMARIZE_AFTER + 4):
+        agent.generate_response("+15550100", f"message {i}", {"services": {}, "business_name": "Spa"})
+    
+    assert len(agent.conversation_history["+15550100"]) == AIEnhancedBookingAgent.SUMMARIZE_AFTER + 2
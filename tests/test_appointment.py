@@ -0,0 +1,42 @@
+from models.appointment import AppointmentManager
+
+
+def _book(manager, time, duration=60, date="2030-06-03", status="confirmed"):
+    return manager.create_appointment(
+        client_phone="+15550100", service="swedish", date=date, time=time,
+        duration=duration, price=80.0, deposit_amount=0.0, status=status
+    )
+
+
+def test_check_availability_rejects_overlaps(tmp_path):
+    manager = AppointmentManager(str(tmp_path))
+    _book(manager, "10:15", duration=75)
+    
+    assert not manager.check_availability("2030-06-03", "10:00", 30)
+    assert not manager.check_availability("2030-06-03", "11:00", 60)
+    assert manager.check_availability("2030-06-03", "09:00", 60)
+    assert manager.check_availability("2030-06-03", "11:30", 60)
+    assert manager.check_availability("2030-06-04", "10:15", 60)
+
+
+def test_cancelled_appointment_frees_its_slot(tmp_path):
+    manager = AppointmentManager(str(tmp_path))
+    appointment = _book(manager, "10:00")
+    
+    manager.cancel_appointment(appointment.id)
+    
+    assert manager.check_availability("2030-06-03", "10:00", 60)
+    assert manager.get_appointments_by_date("2030-06-03") == []
+
+
+def test_appointments_persist_across_managers(tmp_path):
+    manager = AppointmentManager(str(tmp_path))
+    appointment = _book(manager, "10:00")
+    appointment.payment_intent_id = "pi_test"
+    manager.update_appointment(appointment)
+    
+    reloaded = AppointmentManager(str(tmp_path))
+    
+    assert reloaded.get_appointment_by_id(appointment.id) == appointment
+    assert reloaded.get_appointment_by_payment_intent("pi_test").id == appointment.id
+    assert [appt.id for appt in reloaded.get_upcoming_appointments()] == [appointment.id]
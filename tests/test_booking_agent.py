@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+
+
+class FakePaymentProcessor:
+    """Records deposit requests instead of calling Stripe"""
+    
+    def __init__(self):
+        self.deposits = []
+        self.refunds = []
+    
+    def handle_deposit_requirement(self, service, price, appointment_id, client_email=None):
+        self.deposits.append(appointment_id)
+        return {"payment_url": "https://pay.example/deposit", "payment_intent_id": "pi_test",
+                "message": "Please pay your deposit"}
+    
+    def create_refund(self, payment_intent_id):
+        self.refunds.append(payment_intent_id)
+
+
+PHONE = "+15550100"
+
+
+def _future_date(days=3):
+    return (datetime.now() + timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+def _awaiting_deposit(agent):
+    state = agent._get_conversation_state(PHONE)
+    state.update(stage="awaiting_deposit", service="swedish", date=_future_date(), time="10:00")
+    return state
+
+
+def _confirmed_appointment(agent):
+    state = agent._get_conversation_state(PHONE)
+    appointment = agent.appointment_manager.create_appointment(
+        client_phone=PHONE, service="swedish", date=_future_date(), time="10:00",
+        duration=60, price=80.0, deposit_amount=0.0, status="confirmed"
+    )
+    state.update(stage="confirmed", service="swedish", appointment_id=appointment.id)
+    return appointment
+
+
+def test_deposit_yes_creates_appointment(booking_agent):
+    booking_agent.payment_processor = FakePaymentProcessor()
+    state = _awaiting_deposit(booking_agent)
+    
+    assert booking_agent.process_message(PHONE, "proceed") == "Please pay your deposit"
+    assert booking_agent.payment_processor.deposits == [state["appointment_id"]]
+
+
+def test_deposit_no_returns_to_time_selection(booking_agent):
+    booking_agent.payment_processor = FakePaymentProcessor()
+    state = _awaiting_deposit(booking_agent)
+    
+    booking_agent.process_message(PHONE, "no thanks")
+    
+    assert state["stage"] == "collecting_time"
+    assert booking_agent.appointment_manager.appointments == []
+
+
+def test_confirm_does_not_accept_deposit(booking_agent):
+    booking_agent.payment_processor = FakePaymentProcessor()
+    _awaiting_deposit(booking_agent)
+    
+    booking_agent.process_message(PHONE, "confirm")
+    
+    assert booking_agent.payment_processor.deposits == []
+    assert booking_agent.appointment_manager.appointments == []
+
+
+def test_cancel_confirm_cancels_appointment(booking_agent):
+    appointment = _confirmed_appointment(booking_agent)
+    
+    reply = booking_agent.process_message(PHONE, "cancel, I confirm")
+    
+    assert appointment.status == "cancelled"
+    assert "has been cancelled" in reply
+
+
+def test_proceed_does_not_confirm_cancellation(booking_agent):
+    appointment = _confirmed_appointment(booking_agent)
+    
+    booking_agent.process_message(PHONE, "cancel and proceed")
+    
+    assert appointment.status == "confirmed"
+
+
+def _business_day(days=3):
+    day = datetime.now() + timedelta(days=days)
+    while day.weekday() == 6:
+        day += timedelta(days=1)
+    return day
+
+
+def _book_through_time(agent, service_message, day):
+    agent.process_message(PHONE, "I'd like to book a massage")
+    state = agent._get_conversation_state(PHONE)
+    assert state["stage"] == "collecting_service"
+    
+    agent.process_message(PHONE, service_message)
+    assert state["stage"] == "collecting_date"
+    
+    agent.process_message(PHONE, day.strftime("%m/%d/%Y"))
+    assert (state["stage"], state["date"]) == ("collecting_time", day.strftime("%Y-%m-%d"))
+    
+    return state, agent.process_message(PHONE, "2pm works")
+
+
+def test_booking_without_deposit_is_confirmed(booking_agent):
+    state, reply = _book_through_time(booking_agent, "Swedish please", _business_day())
+    
+    assert state["stage"] == "confirmed"
+    appointment = booking_agent.appointment_manager.get_appointment_by_id(state["appointment_id"])
+    assert (appointment.service, appointment.time) == ("swedish", "14:00")
+
+
+def test_booking_with_deposit_asks_for_it(booking_agent):
+    state, reply = _book_through_time(booking_agent, "a hot stone massage", _business_day())
+    
+    assert (state["stage"], state["service"]) == ("awaiting_deposit", "hot_stone")
+    assert "deposit is required" in reply
+    assert booking_agent.appointment_manager.appointments == []
@@ -0,0 +1,54 @@
+import os
+
+from core.conversation_store import ConversationStore
+from models.client import ClientManager
+
+
+def _state(stage, messages):
+    return {"stage": stage, "service": "swedish", "date": None, "time": None,
+            "client": None, "messages": list(messages)}
+
+
+def test_least_recently_used_conversation_spills_and_reloads(tmp_path):
+    clients = ClientManager(str(tmp_path / "data"))
+    store = ConversationStore(str(tmp_path / "spill"), clients, max_entries=1)
+    store.put("+15550100", _state("collecting_date", [{"role": "user", "content": "hi"}]))
+    store.put("+15550101", _state("greeting", []))
+    
+    assert len(store) == 1
+    assert "+15550100" in store
+    assert os.path.exists(tmp_path / "spill" / "+15550100.json")
+    
+    state = store.get("+15550100")
+    
+    assert state["stage"] == "collecting_date"
+    assert state["service"] == "swedish"
+    assert state["messages"] == [{"role": "user", "content": "hi"}]
+    assert state["client"].phone_number == "+15550100"
+    assert not os.path.exists(tmp_path / "spill" / "+15550100.json")
+
+
+def test_messages_are_appended_across_spills(tmp_path):
+    clients = ClientManager(str(tmp_path / "data"))
+    store = ConversationStore(str(tmp_path / "spill"), clients, max_entries=1)
+    store.put("+15550100", _state("greeting", [{"role": "user", "content": "one"}]))
+    store.put("+15550101", _state("greeting", []))
+    
+    state = store.get("+15550100")
+    state["messages"].append({"role": "user", "content": "two"})
+    store.get("+15550101")
+    
+    assert [m["content"] for m in store.get("+15550100")["messages"]] == ["one", "two"]
+
+
+def test_pop_removes_spilled_conversation(tmp_path):
+    clients = ClientManager(str(tmp_path / "data"))
+    store = ConversationStore(str(tmp_path / "spill"), clients, max_entries=1)
+    store.put("+15550100", _state("greeting", [{"role": "user", "content": "hi"}]))
+    store.put("+15550101", _state("greeting", []))
+    
+    store.pop("+15550100")
+    
+    assert "+15550100" not in store
+    assert store.get("+15550100") is None
+    assert os.listdir(tmp_path / "spill") == []
@@ -0,0 +1,31 @@
+import gc
+import os
+import weakref
+
+from core.message_log import MessageLogWriter
+
+
+def test_lines_are_written_per_phone(tmp_path):
+    writer = MessageLogWriter(str(tmp_path))
+    writer.write("+15550100", "first\n")
+    writer.write("+15550101", "other\n")
+    writer.write("+15550100", "second\n")
+    writer.close()
+    
+    assert (tmp_path / "+15550100.log").read_text() == "first\nsecond\n"
+    assert (tmp_path / "+15550101.log").read_text() == "other\n"
+
+
+def test_unused_writer_is_collected_and_its_worker_stops(tmp_path):
+    writer = MessageLogWriter(str(tmp_path))
+    writer.write("+15550100", "line\n")
+    writer.flush()
+    worker = writer._worker
+    writer_ref = weakref.ref(writer)
+    
+    del writer
+    gc.collect()
+    worker.join(timeout=2)
+    
+    assert writer_ref() is None
+    assert not worker.is_alive()
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+
+from core.nlu import NLU
+
+
+def test_booking_intent_outranks_greeting():
+    nlu = NLU()
+    assert nlu.classify_intent("Hi, I'd like to book a massage") == "book"
+    assert nlu.classify_intent("Hello, I need to cancel tomorrow") == "cancel"
+    assert nlu.classify_intent("hey, I need a different time") == "reschedule"
+
+
+def test_plain_greeting():
+    assert NLU().classify_intent("Hello there") == "greeting"
+
+
+def test_booking_details_take_date_from_date_patterns():
+    details = NLU().extract_booking_details("10/17/2026 at 2pm")
+    assert details["date"] == "2026-10-17"
+    assert details["time"] == "14:00"
+
+
+def test_greeting_matches_whole_words_only():
+    nlu = NLU()
+    assert nlu.classify_intent("which hours suit you") == "hours"
+    assert nlu.classify_intent("hi!") == "greeting"
+
+
+def test_classify_intent_by_keyword():
+    nlu = NLU()
+    assert nlu.classify_intent("what services do you offer") == "services"
+    assert nlu.classify_intent("how much is a massage") == "pricing"
+    assert nlu.classify_intent("are you available on friday") == "check_availability"
+    assert nlu.classify_intent("I won't make it") == "cancel"
+
+
+def test_unmatched_message_uses_default_intent():
+    nlu = NLU()
+    assert nlu.classify_intent("sounds good") == "book"
+    assert nlu.classify_intent("sounds good", default_intent=None) is None
+
+
+def test_extract_service_date_and_time():
+    nlu = NLU()
+    tomorrow = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+    assert nlu.extract_service("something with hot stones") == "hot_stone"
+    assert nlu.extract_date("tomorrow please") == tomorrow
+    assert nlu.extract_time("at 3:30 pm") == "15:30"
+    assert nlu.extract_time("no time here") is None
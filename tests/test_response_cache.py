@@ -0,0 +1,23 @@
+from core.response_cache import SemanticCache
+
+
+def test_similar_message_hits_only_in_its_scope():
+    cache = SemanticCache(threshold=0.9)
+    cache.insert("client-a", [1.0, 0.0], "reply a")
+    
+    assert cache.lookup("client-a", [0.99, 0.05]) == "reply a"
+    assert cache.lookup("client-a", [0.0, 1.0]) is None
+    assert cache.lookup("client-b", [1.0, 0.0]) is None
+
+
+def test_expired_and_evicted_entries_miss():
+    expired = SemanticCache(ttl=-1)
+    expired.insert("client-a", [1.0, 0.0], "stale")
+    assert expired.lookup("client-a", [1.0, 0.0]) is None
+    assert not expired.has_entries("client-a")
+    
+    bounded = SemanticCache(max_entries=1)
+    bounded.insert("client-a", [1.0, 0.0], "first")
+    bounded.insert("client-b", [1.0, 0.0], "second")
+    assert not bounded.has_entries("client-a")
+    assert bounded.lookup("client-b", [1.0, 0.0]) == "second"
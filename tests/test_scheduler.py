@@ -0,0 +1,28 @@
+from types import SimpleNamespace
+
+from core.scheduler import Scheduler
+
+
+class FakeAppointments:
+    """Appointment manager stand-in holding one day's appointments"""
+    
+    def __init__(self, appointments):
+        self.appointments = appointments
+    
+    def get_appointments_by_date(self, date):
+        return self.appointments
+
+
+def test_slots_overlapping_an_off_grid_appointment_are_taken():
+    scheduler = Scheduler(FakeAppointments([SimpleNamespace(time="10:15", duration=60)]))
+    
+    # 2030-06-03 is a Monday, open 09:00-20:00
+    slots = scheduler.get_available_slots("2030-06-03")
+    
+    assert slots[:3] == ["09:00", "09:30", "11:30"]
+    assert slots[-1] == "19:00"
+
+
+def test_closed_day_has_no_slots():
+    # 2030-06-02 is a Sunday
+    assert Scheduler(FakeAppointments([])).get_available_slots("2030-06-02") == []